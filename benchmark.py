@@ -0,0 +1,110 @@
+import argparse
+import json
+import platform
+import time
+import tracemalloc
+
+import main
+
+# Benchmark Constants
+BENCHMARK_SCALES = (1, 10)  # Multipliers applied to the base group, subject, lecturer and room counts
+BENCHMARK_OUTPUT = 'benchmark_results.json'
+
+def build_instance(seed, num_groups, num_subjects, num_lecturers, num_rooms):
+    # Seeded synthetic instance, generated in memory as CSV-shaped rows
+    generator = main.Scheduler(seed)
+    generator.generate_groups(num_groups, save=False)
+    generator.generate_subjects(num_subjects, save=False)
+    generator.assign_subjects_to_groups(save=False)
+    generator.generate_lecturers(num_lecturers, save=False)
+    generator.generate_rooms(num_rooms, save=False)
+    return generator.instance_rows()
+
+def run_case(rows, seed, engine='greedy', weekly_pattern=False, weeks=main.SEMESTER_WEEKS):
+    # Time each phase of one scheduling run on an instance
+    scheduler = main.Scheduler(seed, weeks)
+    stats = scheduler.enable_stats()
+    start = time.perf_counter()
+    scheduler.load_rows(*rows)
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scheduler.create_schedule(engine, weekly_pattern=weekly_pattern)
+    schedule_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    penalty = scheduler.total_penalty()
+    penalty_seconds = time.perf_counter() - start
+
+    return {
+        'load_seconds': load_seconds,
+        'schedule_seconds': schedule_seconds,
+        'penalty_seconds': penalty_seconds,
+        'slots_probed': stats.slots_probed,
+        'rejections': dict(stats.rejections),
+        'classes': len(scheduler.schedule),
+        'penalty': penalty,
+    }
+
+def peak_memory(rows, seed, engine='greedy', weekly_pattern=False, weeks=main.SEMESTER_WEEKS):
+    # Separate traced run, so tracemalloc overhead does not distort the timings
+    tracemalloc.start()
+    try:
+        run_case(rows, seed, engine, weekly_pattern, weeks)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run_benchmark(scales=BENCHMARK_SCALES, seed=0, weeks=main.SEMESTER_WEEKS, engine='greedy',
+                  weekly_pattern=False, measure_memory=True, groups=main.NUM_GROUPS, subjects=main.NUM_SUBJECTS,
+                  lecturers=main.NUM_LECTURERS, rooms=main.NUM_ROOMS):
+    # One case per scale, multiplying each base count (groups, subjects, lecturers, rooms) by the scale
+    results = []
+    for scale in scales:
+        params = {
+            'scale': scale,
+            'seed': seed,
+            'groups': groups * scale,
+            'subjects': subjects * scale,
+            'lecturers': lecturers * scale,
+            'rooms': rooms * scale,
+            'weeks': weeks,
+            'engine': engine,
+            'weekly_pattern': weekly_pattern,
+        }
+        rows = build_instance(seed, params['groups'], params['subjects'], params['lecturers'], params['rooms'])
+        result = dict(params)
+        result.update(run_case(rows, seed, engine, weekly_pattern, weeks))
+        if measure_memory:
+            result['peak_memory_bytes'] = peak_memory(rows, seed, engine, weekly_pattern, weeks)
+        results.append(result)
+        print(f"scale {scale}: schedule {result['schedule_seconds']:.3f}s, "
+              f"{result['slots_probed']} slots probed, penalty {result['penalty']}")
+    return results
+
+def write_results(results, path=BENCHMARK_OUTPUT):
+    report = {
+        'python': platform.python_version(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+    with open(path, 'w') as output:
+        json.dump(report, output, indent=2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time load_data, create_schedule and penalty scoring on synthetic instances")
+    parser.add_argument('--scales', type=int, nargs='+', default=list(BENCHMARK_SCALES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--weeks', type=int, default=main.SEMESTER_WEEKS)
+    parser.add_argument('--groups', type=int, default=main.NUM_GROUPS, help="Groups at scale 1")
+    parser.add_argument('--subjects', type=int, default=main.NUM_SUBJECTS, help="Subjects at scale 1")
+    parser.add_argument('--lecturers', type=int, default=main.NUM_LECTURERS, help="Lecturers at scale 1")
+    parser.add_argument('--rooms', type=int, default=main.NUM_ROOMS, help="Rooms at scale 1")
+    parser.add_argument('--engine', choices=['greedy', 'cp'], default='greedy')
+    parser.add_argument('--weekly-pattern', action='store_true')
+    parser.add_argument('--no-memory', action='store_true', help="Skip the traced run for peak memory")
+    parser.add_argument('--output', default=BENCHMARK_OUTPUT)
+    args = parser.parse_args()
+    results = run_benchmark(args.scales, args.seed, args.weeks, args.engine, args.weekly_pattern, not args.no_memory,
+                            args.groups, args.subjects, args.lecturers, args.rooms)
+    write_results(results, args.output)
@@ -0,0 +1,253 @@
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+
+import main
+
+# Checkpoint Constants
+CHECKPOINT_MAGIC = b'SCHDCKPT'
+CHECKPOINT_VERSION = 1
+CHECKPOINT_INTERVAL = 5.0  # Minimum seconds between periodic snapshots
+CHECKPOINT_COMPRESSION = 1  # zlib level: fast, and bitsets and slot lists still shrink well
+HEADER = struct.Struct('<8sHII')  # Magic, format version, body length, CRC-32 of the compressed body
+SECTION = struct.Struct('<I')  # Length prefix of each body section
+
+# Snapshot layout, after the header, as length-prefixed sections of a zlib-compressed body:
+#   meta          JSON: run parameters, stage, progress, input fingerprint, sizes, byte order
+#   rng           array('I') Mersenne Twister state words
+#   availability  lecturer, group and room bitsets, fixed width little-endian per resource (three sections)
+#   free slots    array('i') slot lists of every group's FreeSlotIndex in order, preceded by their lengths
+#   assignments   array('i') (group ID, subject ID) keys and array('d') required/scheduled hours
+#   schedule      encode_schedule payload
+
+def instance_fingerprint(scheduler):
+    # Checkpoints only make sense against the same input data
+    return hashlib.sha256(json.dumps(scheduler.instance_rows(), sort_keys=True).encode()).hexdigest()
+
+def pack_bitsets(bitsets, num_slots):
+    width = (num_slots + 7) // 8
+    return b''.join(bitset.to_bytes(width, 'little') for bitset in bitsets)
+
+def unpack_bitsets(data, count, num_slots):
+    width = (num_slots + 7) // 8
+    return [int.from_bytes(data[i * width:(i + 1) * width], 'little') for i in range(count)]
+
+def encode_checkpoint(scheduler, stage, run, progress, fingerprint=None):
+    version, words, gauss_next = scheduler.rng.getstate()
+    free_lengths = array('i')
+    free_slots = array('i')
+    for name in scheduler.group_availability.names:
+        slots = scheduler.group_free_slots[name].slots
+        free_lengths.append(len(slots))
+        free_slots.extend(slots)
+    keys = array('i')
+    hours = array('d')
+    for group_id, group_name in enumerate(scheduler.group_availability.names):
+        for subject_name, sa in scheduler.group_subject_assignments.get(group_name, {}).items():
+            keys.extend((group_id, scheduler.subject_ids[subject_name]))
+            hours.extend((sa.lecture_hours, sa.practical_hours, sa.lecture_hours_scheduled, sa.practical_hours_scheduled))
+    num_slots = scheduler.group_availability.num_slots
+    meta = {
+        'seed': scheduler.seed,
+        'stage': stage,
+        'run': run,
+        'progress': progress,
+        'fingerprint': fingerprint or instance_fingerprint(scheduler),
+        'num_slots': num_slots,
+        'rng_version': version,
+        'gauss_next': gauss_next,
+        'byteorder': sys.byteorder,
+    }
+    sections = [
+        json.dumps(meta).encode(),
+        array('I', words).tobytes(),
+        pack_bitsets(scheduler.lecturer_availability.by_resource, num_slots),
+        pack_bitsets(scheduler.group_availability.by_resource, num_slots),
+        pack_bitsets(scheduler.room_availability.by_resource, num_slots),
+        free_lengths.tobytes() + free_slots.tobytes(),
+        keys.tobytes(),
+        hours.tobytes(),
+        scheduler.encode_schedule(),
+    ]
+    body = zlib.compress(b''.join(SECTION.pack(len(section)) + section for section in sections), CHECKPOINT_COMPRESSION)
+    return HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, len(body), zlib.crc32(body)) + body
+
+def write_checkpoint(scheduler, path, stage, run=None, progress=None, fingerprint=None):
+    # Atomic: readers see the previous snapshot or the new one, never a partial file
+    data = encode_checkpoint(scheduler, stage, run or {}, progress or {}, fingerprint)
+    temp_file = path + '.tmp'
+    with open(temp_file, 'wb') as snapshot_file:
+        snapshot_file.write(data)
+        snapshot_file.flush()
+        os.fsync(snapshot_file.fileno())
+    os.replace(temp_file, path)
+    return len(data)
+
+def read_checkpoint(path):
+    with open(path, 'rb') as snapshot_file:
+        data = snapshot_file.read()
+    if len(data) < HEADER.size:
+        raise ValueError(f"Truncated checkpoint: {path}")
+    magic, version, length, crc = HEADER.unpack_from(data)
+    if magic != CHECKPOINT_MAGIC:
+        raise ValueError(f"Not a scheduler checkpoint: {path}")
+    if version > CHECKPOINT_VERSION:
+        raise ValueError(f"Checkpoint format {version} is newer than supported format {CHECKPOINT_VERSION}")
+    body = data[HEADER.size:HEADER.size + length]
+    if len(body) != length or zlib.crc32(body) != crc:
+        raise ValueError(f"Corrupted checkpoint: {path}")
+    body = zlib.decompress(body)
+    sections = []
+    position = 0
+    while position < len(body):
+        (size,) = SECTION.unpack_from(body, position)
+        position += SECTION.size
+        sections.append(body[position:position + size])
+        position += size
+    meta = json.loads(sections[0])
+    arrays = []
+    for typecode, section in (('I', sections[1]), ('i', sections[5]), ('i', sections[6]), ('d', sections[7]), ('i', sections[8])):
+        values = array(typecode)
+        values.frombytes(section)
+        if meta['byteorder'] != sys.byteorder:
+            values.byteswap()
+        arrays.append(values)
+    words, free_data, keys, hours, schedule = arrays
+    return {
+        'meta': meta,
+        'rng': words,
+        'availability': sections[2:5],
+        'free_slots': free_data,
+        'keys': keys,
+        'hours': hours,
+        'schedule': schedule.tobytes(),
+    }
+
+def restore_checkpoint(scheduler, snapshot):
+    # Rebuild solver state on a scheduler that has loaded the same input data
+    meta = snapshot['meta']
+    if meta['fingerprint'] != instance_fingerprint(scheduler):
+        raise ValueError("Checkpoint was taken on different input data")
+    scheduler.initialize_schedule()
+    if meta['num_slots'] != scheduler.group_availability.num_slots:
+        raise ValueError("Checkpoint was taken with a different number of time slots")
+    scheduler.decode_schedule(snapshot['schedule'])
+
+    num_slots = meta['num_slots']
+    for availability, data in zip((scheduler.lecturer_availability, scheduler.group_availability,
+                                   scheduler.room_availability), snapshot['availability']):
+        availability.by_resource = unpack_bitsets(data, len(availability.names), num_slots)
+        availability.by_slot = [sum(1 << rid for rid, bitset in enumerate(availability.by_resource) if bitset >> slot & 1)
+                                for slot in range(num_slots)]
+
+    names = scheduler.group_availability.names
+    free_data = snapshot['free_slots']
+    position = len(names)
+    for group_id, name in enumerate(names):
+        length = free_data[group_id]
+        scheduler.group_free_slots[name] = main.FreeSlotIndex(free_data[position:position + length])
+        position += length
+
+    keys = snapshot['keys']
+    hours = snapshot['hours']
+    for index in range(len(keys) // 2):
+        group_name = names[keys[2 * index]]
+        subject = scheduler.subjects[keys[2 * index + 1]]
+        sa = scheduler.group_subject_assignments[group_name].get(subject.name)
+        if sa is None:
+            sa = main.SubjectAssignment(subject, 0, 0)
+            scheduler.group_subject_assignments[group_name][subject.name] = sa
+        sa.lecture_hours, sa.practical_hours, sa.lecture_hours_scheduled, sa.practical_hours_scheduled = \
+            hours[4 * index:4 * index + 4]
+
+    scheduler.rng.setstate((meta['rng_version'], tuple(snapshot['rng']), meta['gauss_next']))
+    if scheduler.scorer is not None:
+        scheduler.scorer.evaluate()
+
+class Checkpointer:
+    # Periodic snapshots of one run; the Scheduler calls maybe() at safe points (after each schedule_classes sweep)
+    def __init__(self, scheduler, path, interval=CHECKPOINT_INTERVAL, run=None):
+        self.scheduler = scheduler
+        self.path = path
+        self.interval = interval
+        self.run = run or {}  # Parameters resume needs to finish the run: engine, weekly_pattern, improve
+        self.fingerprint = instance_fingerprint(scheduler)  # Input data is fixed for the run, so hash it once
+        self.last = time.monotonic()
+        self.written = 0
+        self.seconds = 0.0  # Time spent writing snapshots
+
+    def maybe(self, stage, **progress):
+        if time.monotonic() - self.last >= self.interval:
+            self.write(stage, **progress)
+
+    def write(self, stage, **progress):
+        start = time.monotonic()
+        write_checkpoint(self.scheduler, self.path, stage, self.run, progress, self.fingerprint)
+        self.last = time.monotonic()
+        self.seconds += self.last - start
+        self.written += 1
+
+def finish_run(scheduler, checkpointer, elapsed=0.0):
+    # Local-search part of a run, checkpointed at its progress samples; elapsed is the improvement time already spent
+    improve = checkpointer.run.get('improve', 0.0)
+    if improve > elapsed:
+        def progress(seconds, penalty):
+            checkpointer.maybe('improving', elapsed=elapsed + seconds)
+        scheduler.improve_schedule(improve - elapsed, progress)
+    checkpointer.write('done')
+    return scheduler
+
+def run_checkpointed(path, seed=None, engine='greedy', weekly_pattern=False, improve=0.0,
+                     interval=CHECKPOINT_INTERVAL, use_cache=False):
+    # create_schedule plus optional improvement, snapshotting to path every `interval` seconds.
+    # The CP search itself is not checkpointed: its trail lives in the solver, not in the Scheduler state a snapshot
+    # holds. Snapshots start with the greedy top-up sweeps after a completed search (a search cut short is followed
+    # by an unsnapshotted fallback comparison instead), so an --engine cp run interrupted before then has nothing
+    # to resume and must be started again
+    scheduler = main.Scheduler(seed)
+    scheduler.load_data(use_cache)
+    checkpointer = scheduler.enable_checkpoints(path, interval,
+                                                {'engine': engine, 'weekly_pattern': weekly_pattern, 'improve': improve})
+    scheduler.create_schedule(engine, weekly_pattern)
+    checkpointer.write('scheduled')
+    return finish_run(scheduler, checkpointer)
+
+def resume(path, interval=CHECKPOINT_INTERVAL, use_cache=False):
+    # Continue an interrupted run_checkpointed from its last snapshot. A run interrupted during schedule_classes
+    # finishes exactly as the uninterrupted run would; local search is time-bound, so only its budget carries over
+    snapshot = read_checkpoint(path)
+    meta = snapshot['meta']
+    scheduler = main.Scheduler(meta['seed'])
+    scheduler.load_data(use_cache)
+    restore_checkpoint(scheduler, snapshot)
+    checkpointer = scheduler.enable_checkpoints(path, interval, meta['run'])
+    if meta['stage'] == 'done':
+        return scheduler
+    if meta['stage'] == 'schedule_classes':
+        if meta['progress'].get('changed', True):
+            scheduler.schedule_classes()
+        scheduler.match_slot_rooms()
+        checkpointer.write('scheduled')
+    return finish_run(scheduler, checkpointer, meta['progress'].get('elapsed', 0.0))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run create_schedule with periodic checkpoints, or resume an interrupted run")
+    parser.add_argument('command', choices=['run', 'resume'])
+    parser.add_argument('--path', default='scheduler.checkpoint')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--engine', choices=['greedy', 'cp'], default='greedy')
+    parser.add_argument('--weekly-pattern', action='store_true')
+    parser.add_argument('--improve', type=float, default=0.0, help="Seconds of local search after scheduling")
+    parser.add_argument('--interval', type=float, default=CHECKPOINT_INTERVAL)
+    args = parser.parse_args()
+    if args.command == 'run':
+        scheduler = run_checkpointed(args.path, args.seed, args.engine, args.weekly_pattern, args.improve, args.interval)
+    else:
+        scheduler = resume(args.path, args.interval)
+    scheduler.calculate_penalties()
@@ -0,0 +1,326 @@
+import time
+
+from main import iter_bits, sessions_left
+
+# Search Constants
+CP_TIME_LIMIT = 10.0  # Seconds of search before falling back to the best partial assignment
+CP_INITIAL_FAIL_LIMIT = 100  # Failures allowed before the first restart
+CP_FAIL_LIMIT_GROWTH = 1.5  # Growth of the failure limit between restarts
+CP_STALL_RESTARTS = 3  # Restarts in a row that get no deeper before the instance is taken as over-constrained
+
+class Task:
+    # All remaining 1.5-hour sessions of one (group, subject, class type); a subgroup task also occupies its main group
+    def __init__(self, group, subject, class_type, sessions, lecturer_ids, main_group=None):
+        self.group = group
+        self.subject = subject
+        self.class_type = class_type
+        self.remaining = sessions
+        self.lecturer_ids = lecturer_ids
+        self.main_group = main_group
+
+class CPSolver:
+    # Constraint-propagation engine with backtracking and randomized restarts.
+    # Variables are the tasks' sessions, values are slots (plus a lecturer and room chosen on assignment).
+    # Lecturer/group/room exclusivity and capacity are enforced by the Scheduler availability bitsets,
+    # combined lectures are modelled by letting a lecture session join an existing lecture of the same subject,
+    # and lecture values try those join slots first. A move only changes the resources of its own slot, so after
+    # every assignment (or undo) each cached task domain is re-derived at that one bit, and only tasks whose
+    # domain shrank are checked for wipe-out.
+    def __init__(self, scheduler, time_limit=CP_TIME_LIMIT):
+        self.scheduler = scheduler
+        self.time_limit = time_limit
+        self.tasks = []
+        self.group_demand = {}  # Group name -> sessions still needed that occupy the group
+        self.lectures = {}  # Subject name -> slot -> lecture classes of that subject
+        self.trail = []  # Applied moves, innermost last
+        self.domains = {}  # Task -> bitset of slots a session could still take
+        self.best = []  # Deepest assignment found so far, as recorded moves
+        self.failures = 0
+
+    def build_model(self):
+        sched = self.scheduler
+        for group in sched.groups:
+            for subject_name, sa in group.subjects.items():
+                subject = sa.subject
+                lecture_ids = sched.subject_lecturers.get((subject_name, 'Lecture'), [])
+                practical_ids = sched.subject_lecturers.get((subject_name, 'Practical'), [])
+                self.add_task(group, subject, 'Lecture', sessions_left(sa.lecture_hours, sa.lecture_hours_scheduled), lecture_ids)
+                if subject.requires_subgroups:
+                    cap = sessions_left(sa.practical_hours, sa.practical_hours_scheduled)
+                    for subgroup in sched.subgroups_of(group):
+                        sub_sa = sched.subgroup_assignment(subgroup, subject)
+                        sessions = min(cap, sessions_left(sub_sa.practical_hours, sub_sa.practical_hours_scheduled))
+                        cap -= sessions
+                        self.add_task(subgroup, subject, 'Practical', sessions, practical_ids, main_group=group)
+                else:
+                    self.add_task(group, subject, 'Practical', sessions_left(sa.practical_hours, sa.practical_hours_scheduled), practical_ids)
+        self.trim_root()
+
+    def add_task(self, group, subject, class_type, sessions, lecturer_ids, main_group=None):
+        if sessions <= 0 or not lecturer_ids:
+            return
+        sched = self.scheduler
+        task = Task(group, subject, class_type, sessions, lecturer_ids, main_group)
+        # Bitsets over resource IDs, matched against a slot's free-resource bitsets in refresh
+        task.group_bits = sum(1 << sched.group_availability.id_of(name) for name in self.occupied_groups(task))
+        task.lecturer_bits = sum(1 << lecturer_id for lecturer_id in set(lecturer_ids))
+        task.first_room = sched.room_capacity_index(group.num_students)
+        self.tasks.append(task)
+        for group_name in self.occupied_groups(task):
+            self.group_demand[group_name] = self.group_demand.get(group_name, 0) + sessions
+
+    def occupied_groups(self, task):
+        if task.main_group:
+            return (task.group.name, task.main_group.name)
+        return (task.group.name,)
+
+    def trim_root(self):
+        # Drop sessions that cannot be placed even in an empty timetable, so the search only targets a feasible model
+        for task in self.tasks:
+            excess = task.remaining - self.domain(task).bit_count()
+            if excess > 0:
+                self.drop(task, excess)
+        for group_name, demand in list(self.group_demand.items()):
+            excess = demand - self.group_free(group_name).bit_count()
+            for task in sorted(self.tasks, key=lambda t: -t.remaining):
+                if excess <= 0:
+                    break
+                if group_name in self.occupied_groups(task):
+                    dropped = min(excess, task.remaining)
+                    self.drop(task, dropped)
+                    excess -= dropped
+        self.tasks = [task for task in self.tasks if task.remaining > 0]
+        room_masks = {}
+        self.domains = {task: self.domain(task, room_masks) for task in self.tasks}
+
+    def drop(self, task, sessions):
+        task.remaining -= sessions
+        for group_name in self.occupied_groups(task):
+            self.group_demand[group_name] -= sessions
+
+    def group_free(self, group_name):
+        availability = self.scheduler.group_availability
+        return availability.free_slots(availability.id_of(group_name))
+
+    def rooms_free(self, size):
+        # Slots where at least one room with capacity >= size is free
+        sched = self.scheduler
+        first = sched.room_capacity_index(size)
+        mask = 0
+        for room_id in range(first, len(sched.rooms_by_capacity)):
+            mask |= sched.room_availability.free_slots(room_id)
+        return mask
+
+    def domain(self, task, room_masks=None):
+        sched = self.scheduler
+        mask = self.group_free(task.group.name)
+        if task.main_group:
+            mask &= self.group_free(task.main_group.name)
+        lecturers_free = 0
+        for lecturer_id in task.lecturer_ids:
+            lecturers_free |= sched.lecturer_availability.free_slots(lecturer_id)
+        size = task.group.num_students
+        if room_masks is None:
+            room_masks = {}
+        if size not in room_masks:
+            room_masks[size] = self.rooms_free(size)
+        options = lecturers_free & room_masks[size]
+        if task.class_type == 'Lecture':
+            for slot in self.lectures.get(task.subject.name, {}):
+                options |= 1 << slot
+        return mask & options
+
+    def refresh(self, slot):
+        # Re-derive every cached domain at the slot a move touched (the domain() test at a single bit);
+        # returns the tasks whose domain shrank
+        sched = self.scheduler
+        groups_free = sched.group_availability.free_resources(slot)
+        lecturers_free = sched.lecturer_availability.free_resources(slot)
+        rooms_free = sched.room_availability.free_resources(slot)
+        bit = 1 << slot
+        shrunk = []
+        for task in self.tasks:
+            domain = self.domains[task]
+            if groups_free & task.group_bits == task.group_bits and (
+                    (lecturers_free & task.lecturer_bits and rooms_free >> task.first_room)
+                    or (task.class_type == 'Lecture' and slot in self.lectures.get(task.subject.name, ()))):
+                self.domains[task] = domain | bit
+            elif domain & bit:
+                self.domains[task] = domain & ~bit
+                shrunk.append(task)
+        return shrunk
+
+    def consistent(self, shrunk):
+        # Forward check: every task keeps at least as many slots as sessions. The state before the move was
+        # consistent, so only shrunk domains can fail; group demand minus free slots is unchanged by any move
+        for task in shrunk:
+            if task.remaining and self.domains[task].bit_count() < task.remaining:
+                return False
+        return True
+
+    def select_task(self):
+        # Minimum-slack task first (slots available minus sessions still needed)
+        best = None
+        best_key = None
+        for task in self.tasks:
+            if not task.remaining:
+                continue
+            domain = self.domains[task]
+            key = (domain.bit_count() - task.remaining, -task.remaining)
+            if best_key is None or key < best_key:
+                best, best_key = (task, domain), key
+        return best
+
+    def values(self, task, domain):
+        # Candidate slots in random order, lecture slots that can join an existing lecture first;
+        # each yields the move that would place the session there
+        slots = list(iter_bits(domain))
+        self.scheduler.rng.shuffle(slots)
+        if task.class_type == 'Lecture':
+            joinable = self.lectures.get(task.subject.name, {})
+            slots.sort(key=lambda slot: slot not in joinable)
+        for slot in slots:
+            move = self.make_move(task, slot)
+            if move:
+                yield move
+
+    def make_move(self, task, slot):
+        sched = self.scheduler
+        if task.class_type == 'Lecture':
+            for record in self.lectures.get(task.subject.name, {}).get(slot, []):
+                total = record.total_students + task.group.num_students
+                if sched.class_room(record).capacity >= total or sched.free_rooms(slot, total):
+                    return ('join', task, record)
+        lecturer_ids = [lecturer_id for lecturer_id in task.lecturer_ids
+                        if sched.lecturer_availability.is_free(lecturer_id, slot)]
+        rooms = sched.free_rooms(slot, task.group.num_students)
+        if not lecturer_ids or not rooms:
+            return None
+        # Best-fit room keeps large rooms for combined lectures
+        return ('new', task, (slot, sched.rng.choice(lecturer_ids), rooms[0]))
+
+    def apply(self, move):
+        kind, task, data = move
+        sched = self.scheduler
+        if kind == 'join':
+            record = data
+            previous_room = sched.class_room(record)
+            total = record.total_students + task.group.num_students
+            if previous_room.capacity < total:
+                sched.change_room(record, sched.free_rooms(record.slot, total)[0])
+            sched.join_class(record, task.group)
+            undo = ('join', task, (record, previous_room))
+        else:
+            slot, lecturer_id, room = data
+            record = self.place([task.group], task.subject, task.class_type, lecturer_id, room, slot, task.main_group)
+            undo = ('new', task, record)
+        task.remaining -= 1
+        for group_name in self.occupied_groups(task):
+            self.group_demand[group_name] -= 1
+        self.trail.append(undo)
+        return self.refresh(record.slot)
+
+    def undo(self):
+        kind, task, data = self.trail.pop()
+        sched = self.scheduler
+        if kind == 'join':
+            record, previous_room = data
+            sched.leave_class(record, task.group)
+            if sched.class_room(record) is not previous_room:
+                sched.change_room(record, previous_room)
+            slot = record.slot
+        else:
+            self.remove(data)
+            slot = data.slot
+        task.remaining += 1
+        for group_name in self.occupied_groups(task):
+            self.group_demand[group_name] += 1
+        self.refresh(slot)
+
+    def place(self, groups, subject, class_type, lecturer_id, room, slot, main_group=None):
+        record = self.scheduler.place_class(groups, subject, class_type, lecturer_id, room, slot, main_group)
+        if class_type == 'Lecture':
+            self.lectures.setdefault(subject.name, {}).setdefault(slot, []).append(record)
+        return record
+
+    def remove(self, record):
+        sched = self.scheduler
+        sched.remove_class(record)
+        if sched.class_type(record) == 'Lecture':
+            by_slot = self.lectures[sched.class_subject(record).name]
+            by_slot[record.slot].remove(record)
+            if not by_slot[record.slot]:
+                del by_slot[record.slot]
+
+    def record(self):
+        # Replayable description of the current assignment, in trail order
+        moves = []
+        for kind, task, data in self.trail:
+            record = data[0] if kind == 'join' else data
+            moves.append((kind, task, record.slot, record.lecturer_id, record.room_id))
+        return moves
+
+    def replay(self, moves):
+        sched = self.scheduler
+        for kind, task, slot, lecturer_id, room_id in moves:
+            if kind == 'join':
+                record = next(r for r in self.lectures[task.subject.name][slot] if r.lecturer_id == lecturer_id)
+                self.apply(('join', task, record))
+            else:
+                self.apply(('new', task, (slot, lecturer_id, sched.rooms_by_capacity[room_id])))
+
+    def solve(self):
+        # Returns True when every session of the model was placed
+        self.build_model()
+        deadline = time.monotonic() + self.time_limit
+        total = sum(task.remaining for task in self.tasks)
+        self.best = []
+        fail_limit = CP_INITIAL_FAIL_LIMIT
+        stalled = 0
+        while True:
+            depth = len(self.best)
+            if self.search(deadline, fail_limit, total):
+                return True
+            while self.trail:
+                self.undo()
+            stalled = stalled + 1 if len(self.best) == depth else 0
+            if time.monotonic() >= deadline or stalled >= CP_STALL_RESTARTS:
+                break
+            fail_limit = int(fail_limit * CP_FAIL_LIMIT_GROWTH)
+        # Out of time, or restarts stopped getting deeper: keep the deepest assignment any restart reached
+        self.replay(self.best)
+        return False
+
+    def search(self, deadline, fail_limit, total):
+        # Depth-first search with forward checking; True once every session is placed,
+        # False when the failure limit or the deadline is hit
+        self.failures = 0
+        stack = []
+        while len(self.trail) < total:
+            if len(stack) == len(self.trail):
+                stack.append(self.values(*self.select_task()))
+            move = next(stack[-1], None)
+            if move is None:
+                stack.pop()
+                if not stack:
+                    return False
+                self.backtrack()
+            else:
+                if self.consistent(self.apply(move)):
+                    continue
+                self.undo()
+            self.failures += 1
+            if self.failures >= fail_limit or time.monotonic() >= deadline:
+                self.keep_best()
+                return False
+        return True
+
+    def keep_best(self):
+        # Record the assignment before leaving it, if no earlier one went deeper; recording only on the way out
+        # keeps this off the per-node path
+        if len(self.trail) > len(self.best):
+            self.best = self.record()
+
+    def backtrack(self):
+        self.keep_best()
+        self.undo()
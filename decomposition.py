@@ -0,0 +1,128 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import main
+
+def conflict_components(scheduler):
+    # Groups linked by a shared subject (combined lectures) or by a lecturer able to teach both are in the
+    # same component; distinct components share nothing but rooms. Returns lists of groups, largest first
+    parent = {group.name: group.name for group in scheduler.groups}
+
+    def find(name):
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    def union(names):
+        roots = [find(name) for name in names]
+        for root in roots[1:]:
+            parent[root] = roots[0]
+
+    for groups in scheduler.subject_groups.values():
+        union([group.name for group in groups])
+    for lecturer in scheduler.lecturers:
+        union([group.name for subject_name in lecturer.can_teach_subjects
+               for group in scheduler.subject_groups.get(subject_name, [])])
+
+    components = {}
+    for group in scheduler.groups:
+        components.setdefault(find(group.name), []).append(group)
+    return sorted(components.values(), key=len, reverse=True)
+
+def component_demand(groups):
+    # Student-sessions the component has to seat over the term
+    return sum(group.num_students * (sa.lecture_hours + sa.practical_hours) / 1.5
+               for group in groups for sa in group.subjects.values())
+
+def partition_rooms(scheduler, components):
+    # Hand rooms out largest first, each to the component with the most demand per seat received so far.
+    # Returns one room list per component, or None when there are fewer rooms than components
+    if len(scheduler.rooms) < len(components):
+        return None
+    demands = [component_demand(groups) for groups in components]
+    seats = [0] * len(components)
+    shares = [[] for _ in components]
+    for room in sorted(scheduler.rooms, key=lambda room: room.capacity, reverse=True):
+        empty = [index for index, share in enumerate(shares) if not share]
+        candidates = empty or range(len(components))
+        index = max(candidates, key=lambda i: (demands[i] / (seats[i] + 1), -i))
+        shares[index].append(room)
+        seats[index] += room.capacity
+    return shares
+
+def component_rows(scheduler, groups, rooms):
+    # load_rows input restricted to one component and its share of the rooms
+    group_rows, subject_rows, group_subject_rows, lecturer_rows, room_rows = scheduler.instance_rows()
+    group_names = {group.name for group in groups}
+    subject_names = {subject_name for group in groups for subject_name in group.subjects}
+    room_names = {room.name for room in rooms}
+    lecturers = []
+    for row in lecturer_rows:
+        subjects = [name for name in row['CanTeachSubjects'].split(',') if name in subject_names]
+        if subjects:
+            lecturers.append(dict(row, CanTeachSubjects=','.join(subjects)))
+    return (
+        [row for row in group_rows if row['GroupName'] in group_names],
+        [row for row in subject_rows if row['SubjectName'] in subject_names],
+        [row for row in group_subject_rows if row['GroupName'] in group_names],
+        lecturers,
+        [row for row in room_rows if row['RoomName'] in room_names],
+    )
+
+def schedule_component(seed, rows, engine='greedy', weekly_pattern=False, weeks=main.SEMESTER_WEEKS):
+    # Worker: schedule one component on its own and return its classes by name, since IDs are per instance
+    scheduler = main.Scheduler(seed, weeks)
+    scheduler.load_rows(*rows)
+    scheduler.create_schedule(engine, weekly_pattern=weekly_pattern)
+    group_names = scheduler.group_availability.names
+    return [(record.slot, scheduler.class_subject(record).name, record.type_id, scheduler.class_lecturer(record).name,
+             scheduler.class_room(record).name, group_names[record.main_group_id] if record.main_group_id >= 0 else None,
+             tuple(scheduler.class_group_names(record)))
+            for record in scheduler.schedule]
+
+def merge_component(scheduler, classes):
+    # Place a component's classes on the shared schedule. A room already taken by another component is swapped
+    # for the smallest free room that seats the class; a class with no such room is dropped for the top-up pass.
+    # Returns (rooms reassigned, classes dropped)
+    reassigned = dropped = 0
+    for slot, subject_name, type_id, lecturer_name, room_name, main_group_name, group_names in classes:
+        groups = [scheduler.group_by_name(name) for name in group_names]
+        room = scheduler.room_by_name(room_name)
+        if not scheduler.room_availability.is_free(scheduler.room_availability.id_of(room_name), slot):
+            rooms = scheduler.free_rooms(slot, sum(group.num_students for group in groups))
+            if not rooms:
+                dropped += 1
+                continue
+            room = rooms[0]
+            reassigned += 1
+        subject = scheduler.subjects_by_name[subject_name]
+        main_group = scheduler.group_by_name(main_group_name) if main_group_name else None
+        scheduler.place_class(groups, subject, main.CLASS_TYPES[type_id],
+                              scheduler.lecturer_availability.id_of(lecturer_name), room, slot, main_group)
+    return reassigned, dropped
+
+def schedule_components(scheduler, engine='greedy', weekly_pattern=False, max_workers=None, share_rooms=False):
+    # Schedule every conflict component in its own worker and merge the results into scheduler.schedule,
+    # which must be freshly initialized. Rooms are partitioned by demand unless share_rooms is set (or there are
+    # fewer rooms than components), in which case every component sees all rooms and the merge arbitrates.
+    # Returns (components, rooms reassigned, classes dropped)
+    components = conflict_components(scheduler)
+    shares = None if share_rooms else partition_rooms(scheduler, components)
+    if shares is None:
+        shares = [scheduler.rooms] * len(components)
+    seeds = [scheduler.rng.randrange(2 ** 32) for _ in components]
+    rows = [component_rows(scheduler, groups, rooms) for groups, rooms in zip(components, shares)]
+    if len(components) == 1:
+        results = [schedule_component(seeds[0], rows[0], engine, weekly_pattern, scheduler.weeks)]
+    else:
+        with ProcessPoolExecutor(max_workers=min(len(components), max_workers or os.cpu_count())) as executor:
+            results = list(executor.map(schedule_component, seeds, rows,
+                                        [engine] * len(components), [weekly_pattern] * len(components),
+                                        [scheduler.weeks] * len(components)))
+    reassigned = dropped = 0
+    for classes in results:
+        component_reassigned, component_dropped = merge_component(scheduler, classes)
+        reassigned += component_reassigned
+        dropped += component_dropped
+    return len(components), reassigned, dropped
@@ -0,0 +1,145 @@
+import csv
+import datetime
+import json
+import os
+
+# Export Constants
+EXPORT_BUFFER_SIZE = 1 << 16  # Bytes buffered per output file
+SEMESTER_START = datetime.date(2024, 9, 2)  # Monday of week 1, used to date iCalendar events
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday']
+EXPORT_COLUMNS = ['Week', 'Day', 'Period', 'Start', 'End', 'Type', 'Subject', 'Groups', 'Subgroup',
+                  'Lecturer', 'Room', 'RoomCapacity', 'TotalStudents']
+ENTITY_KINDS = ('group', 'lecturer', 'room')
+
+def entity_records(scheduler, kind=None, name=None):
+    # Records in slot order: the whole term, or one entity's view served from the schedule indexes
+    if kind is None:
+        return iter(scheduler.schedule)
+    if kind == 'group':
+        group_id = scheduler.group_availability.id_of(name)
+        main_group = scheduler.group_entities[group_id].main_group
+        if main_group is None:
+            return iter(scheduler.schedule.for_group(group_id))
+        # A subgroup attends its main group's whole-group classes, but not its sibling subgroups' practicals
+        return (record for record in scheduler.schedule.for_group(scheduler.group_availability.id_of(main_group.name))
+                if record.main_group_id < 0 or group_id in record.group_ids)
+    if kind == 'lecturer':
+        return iter(scheduler.schedule.for_lecturer(scheduler.lecturer_availability.id_of(name)))
+    if kind == 'room':
+        return iter(scheduler.schedule.for_room(scheduler.room_availability.id_of(name)))
+    raise ValueError(f"Unknown entity kind: {kind}")
+
+def iter_entries(scheduler, kind=None, name=None):
+    # One row per class, values in EXPORT_COLUMNS order, resolved straight from the records
+    for record in entity_records(scheduler, kind, name):
+        week, day, period_index = scheduler.slot_key(record.slot)
+        period = scheduler.daily_periods[day][period_index]
+        room = scheduler.class_room(record)
+        groups, subgroup = group_labels(scheduler, record)
+        yield (week + 1, DAY_NAMES[day], period_index + 1, format_time(period['start_time']),
+               format_time(period['end_time']), scheduler.class_type(record), scheduler.class_subject(record).name,
+               groups, subgroup, scheduler.class_lecturer(record).name, room.name, room.capacity, record.total_students)
+
+def group_labels(scheduler, record):
+    # (Groups, Subgroup) columns: a subgroup practical is labelled with its main group and the subgroup
+    names = ','.join(scheduler.class_group_names(record))
+    if record.main_group_id < 0:
+        return names, ''
+    return scheduler.group_availability.names[record.main_group_id], names
+
+def event_uid(record):
+    # Stable across re-exports: a group attends one class per slot, so slot and groups identify the event
+    return f"{record.slot}-{record.subject_id}-{record.type_id}-{'.'.join(map(str, record.group_ids))}@it-lab-3"
+
+def format_time(minutes):
+    return f"{minutes // 60}:{minutes % 60:02d}"
+
+def export_csv(scheduler, path, kind=None, name=None):
+    with open(path, 'w', newline='', buffering=EXPORT_BUFFER_SIZE) as output:
+        writer = csv.writer(output)
+        writer.writerow(EXPORT_COLUMNS)
+        writer.writerows(iter_entries(scheduler, kind, name))
+
+def export_jsonl(scheduler, path, kind=None, name=None):
+    with open(path, 'w', buffering=EXPORT_BUFFER_SIZE) as output:
+        output.writelines(json.dumps(dict(zip(EXPORT_COLUMNS, entry))) + '\n'
+                          for entry in iter_entries(scheduler, kind, name))
+
+def export_ical(scheduler, path, kind=None, name=None, semester_start=SEMESTER_START):
+    with open(path, 'w', newline='', buffering=EXPORT_BUFFER_SIZE) as output:
+        output.writelines(iter_ical_lines(scheduler, kind, name, semester_start))
+
+def iter_ical_lines(scheduler, kind=None, name=None, semester_start=SEMESTER_START):
+    calendar_name = name or 'Schedule'
+    yield 'BEGIN:VCALENDAR\r\n'
+    yield 'VERSION:2.0\r\n'
+    yield 'PRODID:-//it-lab-3//Scheduler//EN\r\n'
+    yield fold(f"X-WR-CALNAME:{escape_text(calendar_name)}")
+    for record in entity_records(scheduler, kind, name):
+        week, day, period_index = scheduler.slot_key(record.slot)
+        period = scheduler.daily_periods[day][period_index]
+        date = semester_start + datetime.timedelta(weeks=week, days=day)
+        room = scheduler.class_room(record)
+        summary = f"{scheduler.class_type(record)} - {scheduler.class_subject(record).name}"
+        groups, subgroup = group_labels(scheduler, record)
+        if subgroup:
+            summary += f" ({subgroup})"
+        description = '\\n'.join(escape_text(part) for part in (
+            f"Groups: {groups.replace(',', ', ')}" + (f" (subgroup {subgroup})" if subgroup else ''),
+            f"Lecturer: {scheduler.class_lecturer(record).name}",
+            f"Total Students: {record.total_students}"))
+        yield 'BEGIN:VEVENT\r\n'
+        yield f"UID:{event_uid(record)}\r\n"
+        yield f"DTSTAMP:{semester_start:%Y%m%d}T000000\r\n"
+        yield f"DTSTART:{ical_datetime(date, period['start_time'])}\r\n"
+        yield f"DTEND:{ical_datetime(date, period['end_time'])}\r\n"
+        yield fold(f"SUMMARY:{escape_text(summary)}")
+        yield fold(f"LOCATION:{escape_text(room.name)}")
+        yield fold(f"DESCRIPTION:{description}")
+        yield 'END:VEVENT\r\n'
+    yield 'END:VCALENDAR\r\n'
+
+def ical_datetime(date, minutes):
+    return f"{date:%Y%m%d}T{minutes // 60:02d}{minutes % 60:02d}00"
+
+def escape_text(text):
+    return text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+def fold(line):
+    # RFC 5545 content lines are folded at 75 octets
+    data = line.encode('utf-8')
+    if len(data) <= 75:
+        return line + '\r\n'
+    parts = []
+    while len(data) > 75:
+        cut = 75 if not parts else 74
+        while cut and (data[cut] & 0xC0) == 0x80:  # Do not split a UTF-8 sequence
+            cut -= 1
+        parts.append(data[:cut].decode('utf-8'))
+        data = data[cut:]
+    parts.append(data.decode('utf-8'))
+    return '\r\n '.join(parts) + '\r\n'
+
+EXPORTERS = {
+    'csv': export_csv,
+    'jsonl': export_jsonl,
+    'ics': export_ical,
+}
+
+def export_entities(scheduler, directory, fmt='csv', kinds=ENTITY_KINDS):
+    # One file per group, lecturer and room, e.g. directory/group/Group_1.csv; returns the paths written
+    exporter = EXPORTERS[fmt]
+    names = {
+        'group': scheduler.group_availability.names,
+        'lecturer': scheduler.lecturer_availability.names,
+        'room': scheduler.room_availability.names,
+    }
+    paths = []
+    for kind in kinds:
+        kind_directory = os.path.join(directory, kind)
+        os.makedirs(kind_directory, exist_ok=True)
+        for name in names[kind]:
+            path = os.path.join(kind_directory, f"{name}.{fmt}")
+            exporter(scheduler, path, kind, name)
+            paths.append(path)
+    return paths
@@ -0,0 +1,346 @@
+import math
+import time
+
+from main import LECTURE
+
+# Annealing Constants
+LOCAL_SEARCH_TIME_BUDGET = 5.0  # Seconds spent improving a finished schedule
+INITIAL_TEMPERATURE = 3.0  # Penalty increase accepted with probability 1/e at the start
+FINAL_TEMPERATURE = 0.05  # Temperature reached when the time budget runs out
+REPORT_INTERVAL = 0.25  # Seconds between penalty-over-time samples
+MOVE_WEIGHTS = {  # Relative frequency of each move
+    'insert': 4,
+    'remove': 1,
+    'relocate': 3,
+    'room': 1,
+    'lecturer': 1,
+    'split': 1,
+    'merge': 2,
+}
+
+class LocalSearch:
+    # Simulated annealing over a finished Scheduler.schedule.
+    # Every move goes through the Scheduler placement primitives and reports its change of the
+    # hour-difference penalty, computed from the SubjectAssignment counters it touches (O(1) per move).
+    # With a Scorer attached (Scheduler.attach_scorer) the weighted objective is annealed instead; the
+    # primitives keep it current, so a move's delta is read off the scorer after applying it.
+    def __init__(self, scheduler, time_budget=LOCAL_SEARCH_TIME_BUDGET, progress=None):
+        self.scheduler = scheduler
+        self.time_budget = time_budget
+        self.progress = progress  # Called with each (seconds elapsed, penalty) sample; returning False stops the search
+        self.rng = scheduler.rng
+        self.classes = []  # Every scheduled class, for O(1) uniform sampling
+        self.positions = {}  # Scheduled class -> index in self.classes
+        self.units = []  # (group, subject, class type, main group) that can receive sessions
+        self.penalty = 0
+        self.history = []  # (seconds elapsed, penalty) samples
+        moves = list(MOVE_WEIGHTS)
+        self.move_table = [move for move in moves for _ in range(MOVE_WEIGHTS[move])]
+
+    def setup(self):
+        sched = self.scheduler
+        for record in sched.schedule:
+            self.track(record)
+        for group in sched.groups:
+            for subject_name, sa in group.subjects.items():
+                subject = sa.subject
+                self.units.append((group, subject, 'Lecture', None))
+                if subject.requires_subgroups:
+                    for subgroup in sched.subgroups_of(group):
+                        self.units.append((subgroup, subject, 'Practical', group))
+                else:
+                    self.units.append((group, subject, 'Practical', None))
+        self.penalty = self.objective()
+
+    def objective(self):
+        sched = self.scheduler
+        return sched.total_penalty() if sched.scorer is None else sched.scorer.total()
+
+    def track(self, record):
+        self.positions[record] = len(self.classes)
+        self.classes.append(record)
+
+    def untrack(self, record):
+        position = self.positions.pop(record)
+        last = self.classes.pop()
+        if position < len(self.classes):
+            self.classes[position] = last
+            self.positions[last] = position
+
+    def hours_delta(self, group_names, subject_name, class_type, change):
+        # Change of the penalty if the listed groups' scheduled hours move by `change`;
+        # only main groups' assignments are part of the penalty
+        sched = self.scheduler
+        delta = 0.0
+        for group_name in group_names:
+            if group_name not in sched.groups_by_name:
+                continue
+            sa = sched.group_subject_assignments[group_name][subject_name]
+            if class_type == 'Lecture':
+                required, scheduled = sa.lecture_hours, sa.lecture_hours_scheduled
+            else:
+                required, scheduled = sa.practical_hours, sa.practical_hours_scheduled
+            delta += abs(scheduled + change - required) - abs(scheduled - required)
+        return delta
+
+    def can_add(self, group_name, subject_name, class_type):
+        sa = self.scheduler.group_subject_assignments[group_name][subject_name]
+        if class_type == 'Lecture':
+            return sa.lecture_hours_scheduled + 1.5 <= sa.lecture_hours
+        return sa.practical_hours_scheduled + 1.5 <= sa.practical_hours
+
+    # Moves: each returns (penalty delta, undo callable) or None when it does not apply
+
+    def move_insert(self):
+        sched = self.scheduler
+        group, subject, class_type, main_group = self.rng.choice(self.units)
+        owners = [group.name] + ([main_group.name] if main_group else [])
+        if not all(self.can_add(name, subject.name, class_type) for name in owners):
+            return None
+        free_slots = sched.group_free_slots[group.name]
+        if not free_slots:
+            return None
+        slot = free_slots.sample(self.rng)
+        if main_group and slot not in sched.group_free_slots[main_group.name]:
+            return None
+        delta = self.hours_delta(owners, subject.name, class_type, 1.5)
+        if class_type == 'Lecture':
+            joined = self.join_existing(group, subject, slot)
+            if joined:
+                return delta, joined
+        record = self.place_new([group], subject, class_type, slot, main_group)
+        if record is None:
+            return None
+        return delta, lambda: self.remove(record)
+
+    def move_remove(self):
+        if not self.classes:
+            return None
+        sched = self.scheduler
+        record = self.rng.choice(self.classes)
+        delta = self.hours_delta(sched.hour_owners(record), sched.class_subject(record).name, sched.class_type(record), -1.5)
+        restore = self.snapshot(record)
+        self.remove(record)
+        return delta, restore
+
+    def move_relocate(self):
+        # Move a whole class to another slot where all its groups, a lecturer and a room are free
+        if not self.classes:
+            return None
+        sched = self.scheduler
+        record = self.rng.choice(self.classes)
+        groups = sched.class_groups(record)
+        main_group = sched.class_main_group(record)
+        subject = sched.class_subject(record)
+        class_type = sched.class_type(record)
+        restore = self.snapshot(record)
+        self.remove(record)
+        slot = sched.group_free_slots[groups[0].name].sample(self.rng)
+        occupied = groups[1:] + ([main_group] if main_group else [])
+        if all(slot in sched.group_free_slots[g.name] for g in occupied):
+            moved = self.place_new(groups, subject, class_type, slot, main_group)
+            if moved is not None:
+                def undo():
+                    self.remove(moved)
+                    restore()
+                return 0.0, undo
+        restore()
+        return None
+
+    def move_room(self):
+        if not self.classes:
+            return None
+        sched = self.scheduler
+        record = self.rng.choice(self.classes)
+        rooms = sched.free_rooms(record.slot, record.total_students)
+        if not rooms:
+            return None
+        previous = sched.class_room(record)
+        sched.change_room(record, self.rng.choice(rooms))
+        return 0.0, lambda: sched.change_room(record, previous)
+
+    def move_lecturer(self):
+        if not self.classes:
+            return None
+        sched = self.scheduler
+        record = self.rng.choice(self.classes)
+        key = (sched.class_subject(record).name, sched.class_type(record))
+        lecturer_ids = [lecturer_id for lecturer_id in sched.subject_lecturers.get(key, [])
+                        if sched.lecturer_availability.is_free(lecturer_id, record.slot)]
+        if not lecturer_ids:
+            return None
+        previous = record.lecturer_id
+        sched.change_lecturer(record, self.rng.choice(lecturer_ids))
+        return 0.0, lambda: sched.change_lecturer(record, previous)
+
+    def move_split(self):
+        # Take one group out of a combined lecture and give it a separate lecture in another slot
+        if not self.classes:
+            return None
+        sched = self.scheduler
+        record = self.rng.choice(self.classes)
+        if record.type_id != LECTURE or len(record.group_ids) < 2:
+            return None
+        group = self.rng.choice(sched.class_groups(record))
+        sched.leave_class(record, group)
+        slot = sched.group_free_slots[group.name].sample(self.rng)
+        separate = self.place_new([group], sched.class_subject(record), 'Lecture', slot)
+        if separate is None:
+            sched.join_class(record, group)
+            return None
+        def undo():
+            self.remove(separate)
+            sched.join_class(record, group)
+        return 0.0, undo
+
+    def move_merge(self):
+        # Fold a group's lecture into another lecture of the same subject, freeing a lecturer and a room
+        if not self.classes:
+            return None
+        sched = self.scheduler
+        record = self.rng.choice(self.classes)
+        if record.type_id != LECTURE:
+            return None
+        group = self.rng.choice(sched.class_groups(record))
+        free_slots = sched.group_free_slots[group.name]
+        if not free_slots:
+            return None
+        slot = free_slots.sample(self.rng)
+        target = self.joinable(record.subject_id, slot, group)
+        if target is None:
+            return None
+        if len(record.group_ids) == 1:
+            restore = self.snapshot(record)
+            self.remove(record)
+        else:
+            sched.leave_class(record, group)
+            restore = lambda: sched.join_class(record, group)
+        sched.join_class(target, group)
+        def undo():
+            sched.leave_class(target, group)
+            restore()
+        return 0.0, undo
+
+    # Helpers keeping self.classes in sync with the schedule
+
+    def joinable(self, subject_id, slot, group):
+        # A lecture of the subject in the slot whose room can also seat the group
+        sched = self.scheduler
+        for record in sched.schedule.in_slot(slot):
+            if (record.subject_id == subject_id and record.type_id == LECTURE
+                    and sched.class_room(record).capacity >= record.total_students + group.num_students):
+                return record
+        return None
+
+    def join_existing(self, group, subject, slot):
+        sched = self.scheduler
+        record = self.joinable(sched.subject_ids[subject.name], slot, group)
+        if record is None:
+            return None
+        sched.join_class(record, group)
+        return lambda: sched.leave_class(record, group)
+
+    def place_new(self, groups, subject, class_type, slot, main_group=None):
+        sched = self.scheduler
+        lecturer_ids = [lecturer_id for lecturer_id in sched.subject_lecturers.get((subject.name, class_type), [])
+                        if sched.lecturer_availability.is_free(lecturer_id, slot)]
+        if not lecturer_ids:
+            return None
+        rooms = sched.free_rooms(slot, sum(g.num_students for g in groups))
+        if not rooms:
+            return None
+        record = sched.place_class(groups, subject, class_type, self.rng.choice(lecturer_ids), rooms[0], slot, main_group)
+        self.track(record)
+        return record
+
+    def remove(self, record):
+        self.scheduler.remove_class(record)
+        self.untrack(record)
+
+    def snapshot(self, record):
+        # Callable that puts a removed class back exactly as it was. The record itself goes back, so undo
+        # callables of earlier moves that refer to it still work when a journal is undone in reverse
+        def restore():
+            self.scheduler.add_class(record)
+            self.track(record)
+        return restore
+
+    def run(self):
+        # Returns the penalty-over-time history; the scheduler is left holding the best schedule found, which is
+        # the starting one unless the penalty went strictly down.
+        # The best state is kept as the undo callables of the moves accepted since (journal), so new bests cost
+        # nothing; a journal longer than the schedule is traded for an encoded copy, amortized O(1) per move
+        self.setup()
+        sched = self.scheduler
+        start = time.monotonic()
+        start_penalty = best_penalty = self.penalty
+        best_payload = None  # Encoded best state, once the journal has been traded for it
+        journal = []
+        changed = False
+        next_report = 0.0
+        self.history.append((0.0, self.penalty))
+        while True:
+            elapsed = time.monotonic() - start
+            if elapsed >= self.time_budget:
+                break
+            if elapsed >= next_report:
+                self.history.append((elapsed, self.penalty))
+                next_report = elapsed + REPORT_INTERVAL
+                if self.progress is not None and self.progress(elapsed, self.penalty) is False:
+                    break
+            progress = elapsed / self.time_budget
+            temperature = INITIAL_TEMPERATURE * (FINAL_TEMPERATURE / INITIAL_TEMPERATURE) ** progress
+            before = sched.scorer.total() if sched.scorer is not None else None
+            classes = len(self.classes)
+            result = getattr(self, 'move_' + self.rng.choice(self.move_table))()
+            if result is None:
+                continue
+            delta, undo = result
+            if before is not None:
+                delta = sched.scorer.total() - before
+            # A move that costs nothing must not add classes either, or free splits pile up
+            if delta < 0 or (delta == 0 and len(self.classes) <= classes) or (
+                    delta > 0 and self.rng.random() < math.exp(-delta / temperature)):
+                self.penalty += delta
+                changed = True
+                if self.penalty < best_penalty:
+                    best_penalty = self.penalty
+                    best_payload = None
+                    journal.clear()
+                elif best_payload is None:
+                    journal.append(undo)
+                    if len(journal) > len(self.classes):
+                        best_payload = self.save_best(journal)
+            else:
+                undo()
+        if changed:
+            if best_payload is not None:
+                self.restore(best_payload)
+            else:
+                self.rewind(journal)
+            if best_penalty < start_penalty:
+                # Moves picked rooms one class at a time; settle each slot's rooms together again
+                sched.match_slot_rooms()
+            self.penalty = self.objective()
+        self.history.append((time.monotonic() - start, self.penalty))
+        return self.history
+
+    def rewind(self, journal):
+        while journal:
+            journal.pop()()
+
+    def save_best(self, journal):
+        # Encode the best state by undoing the journal, then return to the current state
+        sched = self.scheduler
+        current = sched.encode_schedule()
+        self.rewind(journal)
+        best = sched.encode_schedule()
+        self.restore(current)
+        return best
+
+    def restore(self, payload):
+        for record in list(self.classes):
+            self.remove(record)
+        self.scheduler.decode_schedule(payload)
+        for record in self.scheduler.schedule:
+            self.track(record)
@@ -1,6 +1,18 @@
+import bisect
+import cProfile
 import csv
+import json
+import math
+import os
+import pickle
+import pstats
 import random
+import sys
+import time
+from array import array
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
 
 # Constants
 NUM_GROUPS = 5
@@ -21,13 +33,24 @@ ROOM_CAPACITY_RANGE = (40, 100)  # Range for room capacities
 GROUP_SUBJECTS_RANGE = (6, 6)  # Range for number of subjects assigned to each group
 SUBJECT_REQUIRES_SUBGROUPS_PROBABILITY = 0.5  # Probability that a subject requires subgroups
 
+# Input files, in load order, and the binary snapshot load_data(use_cache=True) keeps next to them
+DATA_FILES = ('groups.csv', 'subjects.csv', 'group_subjects.csv', 'lecturers.csv', 'rooms.csv')
+DATA_CACHE_FILE = 'scheduler_data.cache'
+
+# Class types, stored by index in scheduled classes
+CLASS_TYPES = ('Lecture', 'Practical')
+LECTURE = 0
+PRACTICAL = 1
+
 # Data Classes
 class Group:
     def __init__(self, name, num_students):
         self.name = name
         self.num_students = num_students
-        self.subgroups = [f"{name}_A", f"{name}_B"]
+        self.subgroups = [f"{name}_A", f"{name}_B"]  # Subgroup names, as stored in groups.csv
         self.subjects = {}  # Subject name mapped to SubjectAssignment
+        self.subgroup_entities = []  # Subgroup Group objects, created once by Scheduler.build_indexes
+        self.main_group = None  # Main group of a subgroup, None for a main group
 
 class SubjectAssignment:
     def __init__(self, subject, lecture_hours, practical_hours):
@@ -53,69 +76,386 @@ class Room:
         self.name = name
         self.capacity = capacity
 
+def sessions_left(hours, scheduled):
+    # Whole 1.5-hour sessions that fit without exceeding the required hours
+    return max(0, math.floor((hours - scheduled) / 1.5 + 1e-9))
+
+def iter_bits(mask):
+    # Yield the indexes of the set bits of an availability bitset in ascending order
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+def match_rooms(sizes, room_ids, capacities):
+    # Minimum-waste assignment of classes to distinct rooms: sizes[i] students need a room with capacity >= sizes[i].
+    # room_ids must be ascending by capacity (room IDs are). Each class's eligible rooms are a capacity suffix, so the
+    # neighbourhoods are nested and largest class first, smallest fitting room gives a maximum matching with the
+    # fewest empty seats. Returns the room ID for each class, or None if some class cannot be seated
+    pool = list(room_ids)
+    pool_capacities = [capacities[room_id] for room_id in pool]
+    assignment = [None] * len(sizes)
+    for index in sorted(range(len(sizes)), key=lambda i: -sizes[i]):
+        position = bisect.bisect_left(pool_capacities, sizes[index])
+        if position == len(pool):
+            return None
+        assignment[index] = pool.pop(position)
+        del pool_capacities[position]
+    return assignment
+
+class ResourceAvailability:
+    # Dense availability store indexed by integer resource IDs and slot IDs.
+    # Each resource keeps one bitset over all time slots (bit set = free), shaped
+    # (resource, week, day, period) once the slot ID is unpacked, and each slot keeps
+    # the transposed bitset over resource IDs so per-slot queries are a single AND.
+    def __init__(self, names=(), num_slots=0):
+        self.num_slots = num_slots
+        self.names = list(names)
+        self.ids = {name: rid for rid, name in enumerate(self.names)}
+        all_slots = (1 << num_slots) - 1
+        all_resources = (1 << len(self.names)) - 1
+        self.by_resource = [all_slots] * len(self.names)
+        self.by_slot = [all_resources] * num_slots
+
+    def id_of(self, name):
+        return self.ids[name]
+
+    def is_free(self, rid, slot):
+        return self.by_resource[rid] >> slot & 1 == 1
+
+    def reserve(self, rid, slot):
+        self.by_resource[rid] &= ~(1 << slot)
+        self.by_slot[slot] &= ~(1 << rid)
+
+    def release(self, rid, slot):
+        self.by_resource[rid] |= 1 << slot
+        self.by_slot[slot] |= 1 << rid
+
+    def free_slots(self, rid):
+        # Bitset over slot IDs where the resource is free
+        return self.by_resource[rid]
+
+    def free_resources(self, slot):
+        # Bitset over resource IDs that are free in the slot
+        return self.by_slot[slot]
+
+class FreeSlotIndex:
+    # Set of free slot IDs with O(1) add, remove and uniform random sampling.
+    # Built from a range, the index stays a plain "every slot free" marker until it is first used,
+    # so creating one per group costs O(1) and untouched groups never pay for a slot list.
+    def __init__(self, slots=()):
+        self._pending = slots
+        self._slots = self._positions = None
+        if not isinstance(slots, range):
+            self._ensure()
+
+    def _ensure(self):
+        # Build the slot list and positions from the pending slots on first use
+        if self._pending is not None:
+            self._slots = list(self._pending)
+            self._positions = {slot: position for position, slot in enumerate(self._slots)}
+            self._pending = None
+
+    @property
+    def slots(self):
+        self._ensure()
+        return self._slots
+
+    @property
+    def positions(self):
+        self._ensure()
+        return self._positions
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, slot):
+        return slot in self.positions
+
+    def add(self, slot):
+        if slot not in self.positions:
+            self.positions[slot] = len(self.slots)
+            self.slots.append(slot)
+
+    def remove(self, slot):
+        position = self.positions.pop(slot, None)
+        if position is None:
+            return
+        last = self.slots.pop()
+        if position < len(self.slots):
+            self.slots[position] = last
+            self.positions[last] = position
+
+    def sample(self, rng=random):
+        return rng.choice(self.slots)
+
+    def iter_random(self, rng=random):
+        # Lazy Fisher-Yates: yields each free slot once in random order, paying O(1) per slot drawn.
+        # The index must not be modified while the iterator is still in use.
+        slots = self.slots
+        positions = self.positions
+        for i in range(len(slots)):
+            j = rng.randrange(i, len(slots))
+            slots[i], slots[j] = slots[j], slots[i]
+            positions[slots[i]] = i
+            positions[slots[j]] = j
+            yield slots[i]
+
+class ScheduledClass:
+    # One placed class with every field interned to an integer ID
+    __slots__ = ('slot', 'subject_id', 'type_id', 'lecturer_id', 'room_id', 'group_ids', 'main_group_id', 'total_students')
+
+    def __init__(self, slot, subject_id, type_id, lecturer_id, room_id, group_ids, main_group_id, total_students):
+        self.slot = slot
+        self.subject_id = subject_id
+        self.type_id = type_id  # Index into CLASS_TYPES
+        self.lecturer_id = lecturer_id
+        self.room_id = room_id
+        self.group_ids = group_ids  # Tuple of group IDs attending
+        self.main_group_id = main_group_id  # Main group of a subgroup practical, -1 otherwise
+        self.total_students = total_students
+
+class ScheduleStore:
+    # Scheduled classes indexed by slot, group, lecturer and room.
+    # The group index covers every group a class occupies, so a main group also sees its subgroups' practicals.
+    def __init__(self, num_slots=0):
+        self.by_slot = [[] for _ in range(num_slots)]
+        self.by_group = defaultdict(dict)  # Group ID -> records (dict used as an insertion-ordered set)
+        self.by_lecturer = defaultdict(dict)
+        self.by_room = defaultdict(dict)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        # All classes in slot order
+        for records in self.by_slot:
+            yield from records
+
+    def occupied(self, record):
+        if record.main_group_id >= 0:
+            return record.group_ids + (record.main_group_id,)
+        return record.group_ids
+
+    def add(self, record):
+        self.by_slot[record.slot].append(record)
+        for group_id in self.occupied(record):
+            self.by_group[group_id][record] = None
+        self.by_lecturer[record.lecturer_id][record] = None
+        self.by_room[record.room_id][record] = None
+        self.size += 1
+
+    def remove(self, record):
+        self.by_slot[record.slot].remove(record)
+        for group_id in self.occupied(record):
+            del self.by_group[group_id][record]
+        del self.by_lecturer[record.lecturer_id][record]
+        del self.by_room[record.room_id][record]
+        self.size -= 1
+
+    def in_slot(self, slot):
+        return self.by_slot[slot]
+
+    def for_group(self, group_id):
+        return sorted(self.by_group.get(group_id, ()), key=lambda record: record.slot)
+
+    def for_lecturer(self, lecturer_id):
+        return sorted(self.by_lecturer.get(lecturer_id, ()), key=lambda record: record.slot)
+
+    def for_room(self, room_id):
+        return sorted(self.by_room.get(room_id, ()), key=lambda record: record.slot)
+
+    def set_room(self, record, room_id):
+        del self.by_room[record.room_id][record]
+        record.room_id = room_id
+        self.by_room[room_id][record] = None
+
+    def set_lecturer(self, record, lecturer_id):
+        del self.by_lecturer[record.lecturer_id][record]
+        record.lecturer_id = lecturer_id
+        self.by_lecturer[lecturer_id][record] = None
+
+    def add_group(self, record, group_id, num_students):
+        record.group_ids += (group_id,)
+        record.total_students += num_students
+        self.by_group[group_id][record] = None
+
+    def remove_group(self, record, group_id, num_students):
+        record.group_ids = tuple(g for g in record.group_ids if g != group_id)
+        record.total_students -= num_students
+        del self.by_group[group_id][record]
+
+class SchedulerStats:
+    # Counters and timers for a scheduling run. Scheduler.stats stays None unless enable_stats() is called,
+    # and every hook in the hot path is behind that check, so a run without stats pays nothing for them.
+    def __init__(self, profile=False):
+        self.rejections = defaultdict(int)  # Reason -> candidate slots rejected for it
+        self.slots_probed = 0
+        self.placements = 0
+        self.failed_calls = 0  # schedule_class calls that placed nothing
+        self.probes_per_placement = defaultdict(int)  # Slots probed by a successful call -> number of calls
+        self.phase_seconds = defaultdict(float)
+        self.sweep_seconds = []  # Duration of each schedule_classes sweep
+        self.profiler = cProfile.Profile() if profile else None
+
+    @contextmanager
+    def phase(self, name, profile=False):
+        profiler = self.profiler if profile else None
+        if profiler:
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_seconds[name] += time.perf_counter() - start
+            if profiler:
+                profiler.disable()
+
+    def timed(self, function, name):
+        # Wrap a callable so its time accumulates under a phase name
+        def wrapper(*args):
+            start = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                self.phase_seconds[name] += time.perf_counter() - start
+        return wrapper
+
+    def record_call(self, probes, placed):
+        self.slots_probed += probes
+        if placed:
+            self.placements += 1
+            self.probes_per_placement[probes] += 1
+        else:
+            self.failed_calls += 1
+
+    def report(self, top_functions=20):
+        report = {
+            'slots_probed': self.slots_probed,
+            'placements': self.placements,
+            'failed_calls': self.failed_calls,
+            'mean_probes_per_placement': (sum(p * n for p, n in self.probes_per_placement.items()) / self.placements
+                                          if self.placements else 0.0),
+            'probes_per_placement': {str(p): n for p, n in sorted(self.probes_per_placement.items())},
+            'rejections': dict(self.rejections),
+            'phase_seconds': dict(self.phase_seconds),
+            'sweep_seconds': self.sweep_seconds,
+        }
+        if self.profiler:
+            profile = pstats.Stats(self.profiler)
+            rows = sorted(profile.stats.items(), key=lambda item: item[1][3], reverse=True)[:top_functions]
+            report['profile'] = [{'function': f"{filename}:{line}({name})", 'calls': calls,
+                                  'total_seconds': total, 'cumulative_seconds': cumulative}
+                                 for (filename, line, name), (_, calls, total, cumulative, _) in rows]
+        return report
+
+    def write_report(self, path):
+        with open(path, 'w') as output:
+            json.dump(self.report(), output, indent=2)
+
 class Scheduler:
-    def __init__(self):
+    def __init__(self, seed=None, weeks=SEMESTER_WEEKS):
+        self.seed = seed
+        self.weeks = weeks  # Length of the term; fixes the number of time slots
+        self.rng = random.Random(seed)  # All randomness goes through here so a run is reproducible from its seed
         self.groups = []
         self.subjects = []
         self.lecturers = []
         self.rooms = []
-        self.schedule = defaultdict(list)  # Key: (Week, Day, PeriodIndex), Value: List of scheduled classes
-        # Availability will be stored per time slot
-        self.lecturer_availability = defaultdict(lambda: defaultdict(lambda: defaultdict(lambda: defaultdict(bool))))
-        self.group_availability = defaultdict(lambda: defaultdict(lambda: defaultdict(lambda: defaultdict(bool))))
-        self.room_availability = defaultdict(lambda: defaultdict(lambda: defaultdict(lambda: defaultdict(bool))))
+        self.schedule = ScheduleStore()  # Scheduled classes, indexed by slot ID, group, lecturer and room
+        # Availability is stored as dense bitsets per resource, built in create_schedule
+        self.lecturer_availability = ResourceAvailability()
+        self.group_availability = ResourceAvailability()
+        self.room_availability = ResourceAvailability()
         self.daily_periods = []  # Will hold periods for each day
-        self.group_subject_assignments = defaultdict(dict)  # Group name -> subject name -> SubjectAssignment
-        self.room_assignment_index = 0  # For round-robin room assignment
+        self.group_free_slots = {}  # Group or subgroup name -> FreeSlotIndex
+        self.weekly_patterns = []  # Template sessions of create_schedule(weekly_pattern=True)
+        self.group_subject_assignments = defaultdict(dict)  # Group or subgroup name -> subject name -> SubjectAssignment
+        self.subgroups_by_name = {}  # Subgroup name -> Group, linked to its main group by build_indexes
+        self.group_entities = []  # Groups then subgroups, indexed by group ID, built in initialize_schedule
+        self.stats = None  # SchedulerStats while instrumentation is enabled
+        self.scorer = None  # scoring.Scorer kept current by the placement primitives once attached
+        self.checkpointer = None  # checkpoint.Checkpointer writing periodic snapshots once enabled
+        # Lookup indexes built once by load_data
+        self.subject_lecturers = {}  # (Subject name, class type) -> list of lecturer IDs
+        self.subject_groups = defaultdict(list)  # Subject name -> groups taking it
+        self.rooms_by_capacity = []  # Rooms sorted by capacity; room IDs index into this list
+        self.room_capacities = []  # Capacities of rooms_by_capacity, for bisecting
+        self.groups_by_name = {}
+        self.subjects_by_name = {}
+        self.subject_ids = {}  # Subject name -> position in self.subjects
+        self.rooms_by_name = {}
 
-    def generate_groups(self):
-        for i in range(1, NUM_GROUPS + 1):
+    def generate_groups(self, num_groups=NUM_GROUPS, save=True):
+        for i in range(1, num_groups + 1):
             group_name = f"Group_{i}"
             group = Group(group_name, STUDENTS_PER_GROUP)
             self.groups.append(group)
-        self.save_groups_to_csv()
+        if save:
+            self.save_groups_to_csv()
 
-    def generate_subjects(self):
-        for i in range(1, NUM_SUBJECTS + 1):
+    def generate_subjects(self, num_subjects=NUM_SUBJECTS, save=True):
+        for i in range(1, num_subjects + 1):
             subject_name = f"Subject_{i}"
-            requires_subgroups = random.random() < SUBJECT_REQUIRES_SUBGROUPS_PROBABILITY
+            requires_subgroups = self.rng.random() < SUBJECT_REQUIRES_SUBGROUPS_PROBABILITY
             subject = Subject(subject_name, requires_subgroups)
             self.subjects.append(subject)
-        self.save_subjects_to_csv()
+        if save:
+            self.save_subjects_to_csv()
 
-    def assign_subjects_to_groups(self):
+    def assign_subjects_to_groups(self, save=True):
         for group in self.groups:
-            num_subjects = random.randint(*GROUP_SUBJECTS_RANGE)
-            assigned_subjects = random.sample(self.subjects, num_subjects)
+            num_subjects = self.rng.randint(*GROUP_SUBJECTS_RANGE)
+            assigned_subjects = self.rng.sample(self.subjects, num_subjects)
             for subject in assigned_subjects:
-                lecture_hours = random.randint(*LECTURE_HOURS_RANGE)
+                lecture_hours = self.rng.randint(*LECTURE_HOURS_RANGE)
                 if subject.requires_subgroups:
-                    practical_hours = random.randint(*PRACTICAL_HOURS_RANGE_WITH_SUBGROUPS)
+                    practical_hours = self.rng.randint(*PRACTICAL_HOURS_RANGE_WITH_SUBGROUPS)
                 else:
-                    practical_hours = random.randint(*PRACTICAL_HOURS_RANGE_NO_SUBGROUPS)
+                    practical_hours = self.rng.randint(*PRACTICAL_HOURS_RANGE_NO_SUBGROUPS)
                 sa = SubjectAssignment(subject, lecture_hours, practical_hours)
                 group.subjects[subject.name] = sa
                 self.group_subject_assignments[group.name][subject.name] = sa
-        self.save_group_subjects_to_csv()
+        if save:
+            self.save_group_subjects_to_csv()
 
-    def generate_lecturers(self):
+    def generate_lecturers(self, num_lecturers=NUM_LECTURERS, save=True):
         subject_names = [subject.name for subject in self.subjects]
-        for i in range(1, NUM_LECTURERS + 1):
+        for i in range(1, num_lecturers + 1):
             lecturer_name = f"Lecturer_{i}"
-            num_subjects = random.randint(*LECTURER_SUBJECTS_RANGE)
-            can_teach_subjects = random.sample(subject_names, k=num_subjects)
+            num_subjects = self.rng.randint(*LECTURER_SUBJECTS_RANGE)
+            can_teach_subjects = self.rng.sample(subject_names, k=num_subjects)
             can_conduct = ['Lecture', 'Practical']
             lecturer = Lecturer(lecturer_name, can_teach_subjects, can_conduct)
             self.lecturers.append(lecturer)
-        self.save_lecturers_to_csv()
+        if save:
+            self.save_lecturers_to_csv()
 
-    def generate_rooms(self):
-        for i in range(1, NUM_ROOMS + 1):
+    def generate_rooms(self, num_rooms=NUM_ROOMS, save=True):
+        for i in range(1, num_rooms + 1):
             room_name = f"Room_{i}"
-            capacity = random.randint(*ROOM_CAPACITY_RANGE)
+            capacity = self.rng.randint(*ROOM_CAPACITY_RANGE)
             room = Room(room_name, capacity)
             self.rooms.append(room)
-        self.save_rooms_to_csv()
+        if save:
+            self.save_rooms_to_csv()
+
+    def instance_rows(self):
+        # The generated instance as CSV-shaped row dicts, in DATA_FILES order, for load_rows
+        return (
+            [{'GroupName': group.name, 'NumStudents': str(group.num_students), 'Subgroups': ",".join(group.subgroups)}
+             for group in self.groups],
+            [{'SubjectName': subject.name, 'RequiresSubgroups': 'Yes' if subject.requires_subgroups else 'No'}
+             for subject in self.subjects],
+            [{'GroupName': group.name, 'SubjectName': subject_name,
+              'LectureHours': str(sa.lecture_hours), 'PracticalHours': str(sa.practical_hours)}
+             for group in self.groups for subject_name, sa in group.subjects.items()],
+            [{'LecturerName': lecturer.name, 'CanTeachSubjects': ",".join(lecturer.can_teach_subjects),
+              'CanConduct': ",".join(lecturer.can_conduct)}
+             for lecturer in self.lecturers],
+            [{'RoomName': room.name, 'Capacity': str(room.capacity)} for room in self.rooms],
+        )
 
     # Save and Load Methods
     def save_groups_to_csv(self):
@@ -154,59 +494,165 @@ class Scheduler:
             for room in self.rooms:
                 writer.writerow([room.name, room.capacity])
 
-    def read_csv_to_dict(self, filename):
-        with open(filename, 'r') as csvfile:
-            reader = csv.DictReader(csvfile)
-            return list(reader)
+    def iter_csv_rows(self, filename):
+        # Stream a CSV file row by row instead of materialising it
+        with open(filename, 'r', newline='') as csvfile:
+            yield from csv.DictReader(csvfile)
+
+    def load_data(self, use_cache=False):
+        # With use_cache, a binary snapshot keyed by the CSV modification times skips parsing on repeat runs
+        if use_cache:
+            key = self.data_cache_key()
+            if self.load_data_cache(key):
+                return
+        self.load_rows(*(self.iter_csv_rows(filename) for filename in DATA_FILES))
+        if use_cache:
+            self.save_data_cache(key)
 
-    def load_data(self):
+    def load_rows(self, group_rows, subject_rows, group_subject_rows, lecturer_rows, room_rows):
+        # Single pass over each source, building name -> object indexes and checking references as rows arrive
         self.groups = []
         self.subjects = []
         self.lecturers = []
         self.rooms = []
         self.group_subject_assignments = defaultdict(dict)
+        self.groups_by_name = {}
+        self.subjects_by_name = {}
+        self.rooms_by_name = {}
 
-        group_dicts = self.read_csv_to_dict('groups.csv')
-        for gd in group_dicts:
+        for gd in group_rows:
             group = Group(gd['GroupName'], int(gd['NumStudents']))
             group.subgroups = gd['Subgroups'].split(',')
+            if group.name in self.groups_by_name:
+                raise ValueError(f"Duplicate group: {group.name}")
+            self.groups_by_name[group.name] = group
             self.groups.append(group)
 
-        subject_dicts = self.read_csv_to_dict('subjects.csv')
-        for sd in subject_dicts:
+        for sd in subject_rows:
             subject = Subject(
                 sd['SubjectName'],
                 sd['RequiresSubgroups'] == 'Yes'
             )
+            if subject.name in self.subjects_by_name:
+                raise ValueError(f"Duplicate subject: {subject.name}")
+            self.subjects_by_name[subject.name] = subject
             self.subjects.append(subject)
 
-        group_subjects_dicts = self.read_csv_to_dict('group_subjects.csv')
-        for gsd in group_subjects_dicts:
-            group_name = gsd['GroupName']
-            subject_name = gsd['SubjectName']
-            lecture_hours = int(gsd['LectureHours'])
-            practical_hours = int(gsd['PracticalHours'])
-            group = next((g for g in self.groups if g.name == group_name), None)
-            subject = next((s for s in self.subjects if s.name == subject_name), None)
-            if group and subject:
-                sa = SubjectAssignment(subject, lecture_hours, practical_hours)
-                group.subjects[subject.name] = sa
-                self.group_subject_assignments[group.name][subject.name] = sa
+        for gsd in group_subject_rows:
+            group = self.groups_by_name.get(gsd['GroupName'])
+            subject = self.subjects_by_name.get(gsd['SubjectName'])
+            if group is None or subject is None:
+                raise ValueError(f"Unknown group or subject in curriculum row: {gsd['GroupName']}, {gsd['SubjectName']}")
+            if subject.name in group.subjects:
+                raise ValueError(f"Duplicate curriculum row: {group.name}, {subject.name}")
+            sa = SubjectAssignment(subject, int(gsd['LectureHours']), int(gsd['PracticalHours']))
+            group.subjects[subject.name] = sa
+            self.group_subject_assignments[group.name][subject.name] = sa
 
-        lecturer_dicts = self.read_csv_to_dict('lecturers.csv')
-        for ld in lecturer_dicts:
+        lecturer_names = set()
+        for ld in lecturer_rows:
             lecturer = Lecturer(
                 ld['LecturerName'],
                 ld['CanTeachSubjects'].split(','),
                 ld['CanConduct'].split(',')
             )
+            if lecturer.name in lecturer_names:
+                raise ValueError(f"Duplicate lecturer: {lecturer.name}")
+            unknown = [name for name in lecturer.can_teach_subjects if name not in self.subjects_by_name]
+            if unknown:
+                raise ValueError(f"{lecturer.name} teaches unknown subjects: {', '.join(unknown)}")
+            unknown = [class_type for class_type in lecturer.can_conduct if class_type not in CLASS_TYPES]
+            if unknown:
+                raise ValueError(f"{lecturer.name} conducts unknown class types: {', '.join(unknown)}")
+            lecturer_names.add(lecturer.name)
             self.lecturers.append(lecturer)
 
-        room_dicts = self.read_csv_to_dict('rooms.csv')
-        for rd in room_dicts:
+        for rd in room_rows:
             room = Room(rd['RoomName'], int(rd['Capacity']))
+            if room.name in self.rooms_by_name:
+                raise ValueError(f"Duplicate room: {room.name}")
+            self.rooms_by_name[room.name] = room
             self.rooms.append(room)
 
+        self.build_indexes()
+
+    def data_cache_key(self):
+        return tuple((filename, os.stat(filename).st_mtime_ns, os.stat(filename).st_size) for filename in DATA_FILES)
+
+    def load_data_cache(self, key):
+        try:
+            with open(DATA_CACHE_FILE, 'rb') as cache_file:
+                cached_key, data = pickle.load(cache_file)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return False
+        if cached_key != key:
+            return False
+        (self.groups, self.subjects, self.lecturers, self.rooms, self.group_subject_assignments,
+         self.groups_by_name, self.subjects_by_name, self.rooms_by_name) = data
+        self.build_indexes()
+        return True
+
+    def save_data_cache(self, key):
+        data = (self.groups, self.subjects, self.lecturers, self.rooms, self.group_subject_assignments,
+                self.groups_by_name, self.subjects_by_name, self.rooms_by_name)
+        temp_file = DATA_CACHE_FILE + '.tmp'
+        with open(temp_file, 'wb') as cache_file:
+            pickle.dump((key, data), cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_file, DATA_CACHE_FILE)
+
+    def build_indexes(self):
+        # Lecturer IDs are positions in self.lecturers
+        self.subject_lecturers = defaultdict(list)
+        for lecturer_id, lecturer in enumerate(self.lecturers):
+            for subject_name in lecturer.can_teach_subjects:
+                for class_type in lecturer.can_conduct:
+                    self.subject_lecturers[(subject_name, class_type)].append(lecturer_id)
+        self.subject_lecturers = dict(self.subject_lecturers)
+
+        self.subject_groups = defaultdict(list)
+        for group in self.groups:
+            for subject_name in group.subjects:
+                self.subject_groups[subject_name].append(group)
+
+        # Room IDs are positions in rooms_by_capacity, so "capacity >= N" is a suffix of the ID range
+        self.rooms_by_capacity = sorted(self.rooms, key=lambda room: room.capacity)
+        self.room_capacities = [room.capacity for room in self.rooms_by_capacity]
+        self.subject_ids = {subject.name: subject_id for subject_id, subject in enumerate(self.subjects)}
+        self.link_subgroups()
+
+    def group_by_name(self, name):
+        group = self.groups_by_name.get(name)
+        if group is None:
+            group = self.subgroups_by_name[name]
+        return group
+
+    def room_by_name(self, name):
+        return self.rooms_by_name[name]
+
+    def subgroups_of(self, group):
+        return group.subgroup_entities
+
+    def subgroup_assignment(self, subgroup, subject):
+        return subgroup.subjects[subject.name]
+
+    def link_subgroups(self):
+        # Subgroups become Group entities once per load, each holding its share of the main group's
+        # practicals; their subjects dict is the group_subject_assignments entry, so both views agree
+        self.subgroups_by_name = {}
+        for group in self.groups:
+            group.subgroup_entities = []
+            for subgroup_name in group.subgroups:
+                subgroup = Group(subgroup_name, group.num_students // 2)
+                subgroup.subgroups = []
+                subgroup.main_group = group
+                subgroup.subjects = self.group_subject_assignments[subgroup_name]
+                for subject_name, sa in group.subjects.items():
+                    if sa.subject.requires_subgroups and subject_name not in subgroup.subjects:
+                        # Subgroups take an even share of the main group's practical hours
+                        subgroup.subjects[subject_name] = SubjectAssignment(sa.subject, 0, sa.practical_hours / len(group.subgroups))
+                group.subgroup_entities.append(subgroup)
+                self.subgroups_by_name[subgroup_name] = subgroup
+
     def generate_daily_periods(self):
         self.daily_periods = []
         fixed_periods = [
@@ -225,89 +671,592 @@ class Scheduler:
                 })
             self.daily_periods.append(day_periods)
 
-    def create_schedule(self):
-        # Generate daily periods
-        self.generate_daily_periods()
+    def slot_id(self, week, day, period_index):
+        return (week * DAYS_PER_WEEK + day) * PERIODS_PER_DAY + period_index
 
-        # Generate time slots
-        self.time_slots = []
-        for week in range(SEMESTER_WEEKS):
-            for day_index, periods in enumerate(self.daily_periods):
-                for period in periods:
-                    period_index = period['period_index']
-                    self.time_slots.append((week, day_index, period_index))
+    def slot_key(self, slot):
+        # Inverse of slot_id: (Week, Day, PeriodIndex)
+        week_day, period_index = divmod(slot, PERIODS_PER_DAY)
+        week, day = divmod(week_day, DAYS_PER_WEEK)
+        return week, day, period_index
+
+    def reserve_group(self, group_name, slot):
+        self.group_availability.reserve(self.group_availability.id_of(group_name), slot)
+        self.group_free_slots[group_name].remove(slot)
+
+    def release_group(self, group_name, slot):
+        self.group_availability.release(self.group_availability.id_of(group_name), slot)
+        self.group_free_slots[group_name].add(slot)
+
+    def place_class(self, groups, subject, class_type, lecturer_id, room, slot, main_group=None):
+        # Commit a class: record it in the schedule, take the resources and count the hours
+        group_ids = self.group_availability.ids
+        record = ScheduledClass(slot, self.subject_ids[subject.name], CLASS_TYPES.index(class_type), lecturer_id,
+                                self.room_availability.id_of(room.name), tuple(group_ids[g.name] for g in groups),
+                                group_ids[main_group.name] if main_group else -1,
+                                sum(g.num_students for g in groups))
+        self.add_class(record)
+        return record
+
+    def add_class(self, record):
+        # Commit an existing record, e.g. one taken out with remove_class, so references to it stay valid
+        self.schedule.add(record)
+        if self.scorer is not None:
+            self.scorer.add(record)
+        # Update availability
+        self.lecturer_availability.reserve(record.lecturer_id, record.slot)
+        self.room_availability.reserve(record.room_id, record.slot)
+        for group_id in self.schedule.occupied(record):
+            self.reserve_group(self.group_availability.names[group_id], record.slot)
+        self.count_hours(record, 1.5)
+
+    def remove_class(self, record):
+        # Exact inverse of add_class
+        if self.scorer is not None:
+            self.scorer.remove(record)
+        self.schedule.remove(record)
+        self.lecturer_availability.release(record.lecturer_id, record.slot)
+        self.room_availability.release(record.room_id, record.slot)
+        for group_id in self.schedule.occupied(record):
+            self.release_group(self.group_availability.names[group_id], record.slot)
+        self.count_hours(record, -1.5)
+
+    def count_hours(self, record, hours, group_ids=None):
+        # Groups whose SubjectAssignment counts a class; a subgroup practical also counts for its main group
+        subject_name = self.subjects[record.subject_id].name
+        for group_id in self.schedule.occupied(record) if group_ids is None else group_ids:
+            sa = self.group_subject_assignments[self.group_availability.names[group_id]][subject_name]
+            if record.type_id == LECTURE:
+                sa.lecture_hours_scheduled += hours
+            else:
+                sa.practical_hours_scheduled += hours
+            if self.scorer is not None:
+                self.scorer.hours_changed(self.group_availability.names[group_id], sa, record.type_id, hours)
+
+    def hour_owners(self, record):
+        # Names of the groups whose SubjectAssignment counts the class
+        return [self.group_availability.names[group_id] for group_id in self.schedule.occupied(record)]
+
+    def encode_schedule(self):
+        # Compact transfer format: one run of ints per class, packed into bytes
+        #   slot, subject ID, type ID, lecturer ID, room ID, main group ID (-1 if none), number of groups, group IDs...
+        data = array('i')
+        for record in self.schedule:
+            data.extend((record.slot, record.subject_id, record.type_id, record.lecturer_id, record.room_id,
+                         record.main_group_id, len(record.group_ids)))
+            data.extend(record.group_ids)
+        return data.tobytes()
+
+    def decode_schedule(self, payload):
+        # Replay an encode_schedule payload onto a freshly initialized schedule with the same input data
+        data = array('i')
+        data.frombytes(payload)
+        position = 0
+        while position < len(data):
+            slot, subject_id, type_id, lecturer_id, room_id, main_group_id, num_groups = data[position:position + 7]
+            position += 7
+            groups = [self.group_entities[group_id] for group_id in data[position:position + num_groups]]
+            position += num_groups
+            subject = self.subjects[subject_id]
+            main_group = self.group_entities[main_group_id] if main_group_id >= 0 else None
+            self.place_class(groups, subject, CLASS_TYPES[type_id], lecturer_id,
+                             self.rooms_by_capacity[room_id], slot, main_group)
+
+    def change_room(self, record, room):
+        if self.scorer is not None:
+            self.scorer.remove(record)
+        self.room_availability.release(record.room_id, record.slot)
+        room_id = self.room_availability.id_of(room.name)
+        self.room_availability.reserve(room_id, record.slot)
+        self.schedule.set_room(record, room_id)
+        if self.scorer is not None:
+            self.scorer.add(record)
+
+    def change_lecturer(self, record, lecturer_id):
+        if self.scorer is not None:
+            self.scorer.remove(record)
+        self.lecturer_availability.release(record.lecturer_id, record.slot)
+        self.lecturer_availability.reserve(lecturer_id, record.slot)
+        self.schedule.set_lecturer(record, lecturer_id)
+        if self.scorer is not None:
+            self.scorer.add(record)
+
+    def join_class(self, record, group):
+        # Add a group to a scheduled lecture; the caller makes sure the room is big enough
+        group_id = self.group_availability.id_of(group.name)
+        if self.scorer is not None:
+            self.scorer.remove(record)
+        self.reserve_group(group.name, record.slot)
+        self.schedule.add_group(record, group_id, group.num_students)
+        if self.scorer is not None:
+            self.scorer.add(record)
+        self.count_hours(record, 1.5, (group_id,))
+
+    def leave_class(self, record, group):
+        group_id = self.group_availability.id_of(group.name)
+        if self.scorer is not None:
+            self.scorer.remove(record)
+        self.release_group(group.name, record.slot)
+        self.schedule.remove_group(record, group_id, group.num_students)
+        if self.scorer is not None:
+            self.scorer.add(record)
+        self.count_hours(record, -1.5, (group_id,))
 
-                    # Initialize availability to True
-                    for lecturer in self.lecturers:
-                        self.lecturer_availability[lecturer.name][week][day_index][period_index] = True
-                    for group in self.groups + [Group(sg, group.num_students // 2) for group in self.groups for sg in group.subgroups]:
-                        self.group_availability[group.name][week][day_index][period_index] = True
-                    for room in self.rooms:
-                        self.room_availability[room.name][week][day_index][period_index] = True
+    # Record accessors, resolving interned IDs without building dicts
 
-        # Schedule lectures and practicals
-        self.schedule_classes()
+    def class_subject(self, record):
+        return self.subjects[record.subject_id]
+
+    def class_type(self, record):
+        return CLASS_TYPES[record.type_id]
+
+    def class_lecturer(self, record):
+        return self.lecturers[record.lecturer_id]
+
+    def class_room(self, record):
+        return self.rooms_by_capacity[record.room_id]
+
+    def class_groups(self, record):
+        return [self.group_entities[group_id] for group_id in record.group_ids]
+
+    def class_group_names(self, record):
+        return [self.group_availability.names[group_id] for group_id in record.group_ids]
+
+    def class_main_group(self, record):
+        if record.main_group_id < 0:
+            return None
+        return self.group_entities[record.main_group_id]
+
+    def room_capacity_index(self, min_capacity):
+        # First room ID whose capacity is >= min_capacity
+        return bisect.bisect_left(self.room_capacities, min_capacity)
+
+    def free_rooms(self, slot, min_capacity):
+        # All rooms free in the slot with capacity >= min_capacity, smallest first
+        first = self.room_capacity_index(min_capacity)
+        free = self.room_availability.free_resources(slot) >> first
+        return [self.rooms_by_capacity[first + offset] for offset in iter_bits(free)]
+
+    def rematch_rooms(self, slot, min_capacity):
+        # Per-slot feasibility check for a class no free room can seat: re-match the slot's classes and the new one
+        # over every room they could use. If that fits, the existing classes are moved and the room left for the
+        # new class is returned; otherwise nothing changes and None is returned
+        records = list(self.schedule.in_slot(slot))
+        free = self.room_availability.free_resources(slot)
+        if not records or not free:
+            return None
+        room_ids = sorted([record.room_id for record in records] + list(iter_bits(free)))
+        if self.room_capacities[room_ids[-1]] < min_capacity:
+            return None
+        assignment = match_rooms([record.total_students for record in records] + [min_capacity], room_ids,
+                                 self.room_capacities)
+        if assignment is None:
+            return None
+        self.move_rooms(records, assignment[:-1])
+        return self.rooms_by_capacity[assignment[-1]]
+
+    def move_rooms(self, records, room_ids):
+        # Reassign rooms within one slot all at once, so rooms can be swapped between its classes
+        for record in records:
+            if self.scorer is not None:
+                self.scorer.remove(record)
+            self.room_availability.release(record.room_id, record.slot)
+        for record, room_id in zip(records, room_ids):
+            self.room_availability.reserve(room_id, record.slot)
+            self.schedule.set_room(record, room_id)
+            if self.scorer is not None:
+                self.scorer.add(record)
+
+    def match_slot_rooms(self):
+        # Post-placement pass: give every slot's classes the minimum-waste room assignment; returns seats freed
+        saved = 0
+        for slot in range(len(self.schedule.by_slot)):
+            records = list(self.schedule.in_slot(slot))
+            if not records:
+                continue
+            room_ids = sorted([record.room_id for record in records] + list(iter_bits(self.room_availability.free_resources(slot))))
+            assignment = match_rooms([record.total_students for record in records], room_ids, self.room_capacities)
+            before = sum(self.room_capacities[record.room_id] for record in records)
+            after = sum(self.room_capacities[room_id] for room_id in assignment)
+            if after < before:
+                self.move_rooms(records, assignment)
+                saved += before - after
+        return saved
+
+    def candidate_slots(self, group, lecturer_ids, main_group=None):
+        # Bitset of slots where the group, its main group and at least one of the lecturers are all free
+        lecturers_free = 0
+        for lecturer_id in lecturer_ids:
+            lecturers_free |= self.lecturer_availability.free_slots(lecturer_id)
+        mask = self.group_availability.free_slots(self.group_availability.id_of(group.name)) & lecturers_free
+        if main_group:
+            mask &= self.group_availability.free_slots(self.group_availability.id_of(main_group.name))
+        return mask
+
+    def enable_stats(self, profile=False):
+        # Start collecting counters and phase timings; profile=True also runs create_schedule under cProfile
+        self.stats = SchedulerStats(profile)
+        return self.stats
+
+    def attach_scorer(self, weights=None):
+        # Weighted hard/soft scoring kept up to date incrementally from here on; weights=None uses the defaults
+        from scoring import Scorer
+        self.scorer = Scorer(self, weights)
+        self.scorer.evaluate()
+        return self.scorer
+
+    def enable_checkpoints(self, path, interval=None, run=None):
+        # Snapshot solver state to path at most every `interval` seconds; see checkpoint.resume
+        from checkpoint import Checkpointer, CHECKPOINT_INTERVAL
+        self.checkpointer = Checkpointer(self, path, CHECKPOINT_INTERVAL if interval is None else interval, run)
+        return self.checkpointer
+
+    def phase(self, name, profile=False):
+        if self.stats is None:
+            return nullcontext()
+        return self.stats.phase(name, profile)
+
+    def create_schedule(self, engine='greedy', weekly_pattern=False, decompose=False, max_workers=None, time_limit=None):
+        # time_limit bounds the CP search in seconds (default CP_TIME_LIMIT); the greedy engine ignores it
+        # decompose=True schedules each independent cluster of groups (no shared subjects or lecturers) in its own
+        # worker process, merges the results and then runs the greedy engine over the merged schedule as a top-up
+        if engine not in ('greedy', 'cp'):
+            raise ValueError(f"Unknown scheduling engine: {engine}")
+        with self.phase('create_schedule', profile=True):
+            with self.phase('initialize'):
+                self.initialize_schedule()
+
+            if decompose:
+                from decomposition import schedule_components
+                with self.phase('decompose'):
+                    schedule_components(self, engine, weekly_pattern, max_workers)
+                # Hours a component could not place in its own share of the rooms may fit in other components' rooms
+                with self.phase('top_up'):
+                    self.schedule_classes()
+            else:
+                if weekly_pattern:
+                    # Recurring sessions are solved on a one-week template and expanded to every week;
+                    # the engine below then places the leftover sessions in concrete weeks
+                    with self.phase('weekly_patterns'):
+                        self.weekly_patterns = self.schedule_weekly_patterns()
+                        for slot, (_, groups, subject, class_type, lecturer_id, room, main_group) in self.expand_weekly_patterns():
+                            self.place_class(groups, subject, class_type, lecturer_id, room, slot, main_group)
+
+                # Schedule lectures and practicals
+                if engine == 'cp':
+                    from cp_solver import CPSolver, CP_TIME_LIMIT
+                    start = self.encode_schedule()
+                    with self.phase('cp_search'):
+                        solved = CPSolver(self, CP_TIME_LIMIT if time_limit is None else time_limit).solve()
+                    if solved:
+                        # Top up anything the model had to leave out
+                        self.schedule_classes()
+                    else:
+                        # A search cut short can leave a partial assignment the top-up completes worse than it
+                        # would have completed the starting schedule; keep whichever ends lower
+                        with self.phase('cp_fallback'):
+                            self.keep_better_schedule(start)
+                else:
+                    self.schedule_classes()
+
+            # Classes were given rooms one at a time; settle each slot's rooms together
+            with self.phase('room_matching'):
+                self.match_slot_rooms()
+
+    def schedule_weekly_patterns(self):
+        # Greedy placement of each assignment's whole-week share of sessions on a template week.
+        # An assignment needing n sessions gets n // weeks recurring ones here; the remaining
+        # n % weeks (and any recurring session that found no template slot) are left for the engine.
+        template_size = DAYS_PER_WEEK * PERIODS_PER_DAY
+        lecturers = ResourceAvailability(self.lecturer_availability.names, template_size)
+        groups = ResourceAvailability(self.group_availability.names, template_size)
+        rooms = ResourceAvailability(self.room_availability.names, template_size)
+        weekly_left = {}  # (Group name, subject name, class type) -> recurring sessions still to place
+        units = []
+        for group in self.groups:
+            for subject_name, sa in group.subjects.items():
+                subject = sa.subject
+                weekly_left[(group.name, subject_name, 'Lecture')] = (
+                    sessions_left(sa.lecture_hours, sa.lecture_hours_scheduled) // self.weeks)
+                units.append((group, subject, 'Lecture', None))
+                if subject.requires_subgroups:
+                    cap = sessions_left(sa.practical_hours, sa.practical_hours_scheduled)
+                    for subgroup in self.subgroups_of(group):
+                        sub_sa = self.subgroup_assignment(subgroup, subject)
+                        sessions = min(cap, sessions_left(sub_sa.practical_hours, sub_sa.practical_hours_scheduled))
+                        cap -= sessions
+                        weekly_left[(subgroup.name, subject_name, 'Practical')] = sessions // self.weeks
+                        units.append((subgroup, subject, 'Practical', group))
+                else:
+                    weekly_left[(group.name, subject_name, 'Practical')] = (
+                        sessions_left(sa.practical_hours, sa.practical_hours_scheduled) // self.weeks)
+                    units.append((group, subject, 'Practical', None))
+
+        patterns = []
+        template_slots = list(range(template_size))
+        for group, subject, class_type, main_group in units:
+            key = (group.name, subject.name, class_type)
+            self.rng.shuffle(template_slots)
+            for template_slot in template_slots:
+                if not weekly_left[key]:
+                    break
+                if not groups.is_free(groups.id_of(group.name), template_slot):
+                    continue
+                if main_group and not groups.is_free(groups.id_of(main_group.name), template_slot):
+                    continue
+                lecturer_ids = [lecturer_id for lecturer_id in self.subject_lecturers.get((subject.name, class_type), [])
+                                if lecturers.is_free(lecturer_id, template_slot)]
+                if not lecturer_ids:
+                    continue
+                free_rooms = rooms.free_resources(template_slot)
+                if not free_rooms:
+                    continue
+                # Combine other groups needing the lecture only while the largest free room can still seat them
+                capacity_left = self.room_capacities[free_rooms.bit_length() - 1] - group.num_students
+                combined_groups = [group]
+                if class_type == 'Lecture':
+                    for other_group in self.subject_groups[subject.name]:
+                        if (other_group.name != group.name and other_group.num_students <= capacity_left
+                                and weekly_left[(other_group.name, subject.name, 'Lecture')]
+                                and groups.is_free(groups.id_of(other_group.name), template_slot)):
+                            combined_groups.append(other_group)
+                            capacity_left -= other_group.num_students
+                first = self.room_capacity_index(sum(g.num_students for g in combined_groups))
+                free = free_rooms >> first
+                if not free:
+                    continue
+                room_id = first + next(iter_bits(free))
+                lecturer_id = self.rng.choice(lecturer_ids)
+                lecturers.reserve(lecturer_id, template_slot)
+                rooms.reserve(room_id, template_slot)
+                for g in combined_groups:
+                    groups.reserve(groups.id_of(g.name), template_slot)
+                    weekly_left[(g.name, subject.name, class_type)] -= 1
+                if main_group:
+                    groups.reserve(groups.id_of(main_group.name), template_slot)
+                patterns.append((template_slot, combined_groups, subject, class_type, lecturer_id,
+                                 self.rooms_by_capacity[room_id], main_group))
+        return patterns
+
+    def expand_weekly_patterns(self):
+        # Lazily yield (slot ID, pattern) for every week a template session recurs in
+        template_size = DAYS_PER_WEEK * PERIODS_PER_DAY
+        for pattern in self.weekly_patterns:
+            for week in range(self.weeks):
+                yield week * template_size + pattern[0], pattern
+
+    def improve_schedule(self, time_budget=None, progress=None):
+        # Local-search repair of the current schedule; returns (seconds, penalty) samples.
+        # progress(seconds, penalty) is called at every sample and can return False to stop early
+        from local_search import LocalSearch, LOCAL_SEARCH_TIME_BUDGET
+        search = LocalSearch(self, LOCAL_SEARCH_TIME_BUDGET if time_budget is None else time_budget, progress)
+        return search.run()
+
+    def clear_schedule(self):
+        for record in list(self.schedule):
+            self.remove_class(record)
+
+    def keep_better_schedule(self, start):
+        # Complete the current schedule and, separately, an encode_schedule payload with the greedy engine, keeping
+        # the lower-penalty result. Neither run is checkpointed: a snapshot of one would resume without the comparison
+        checkpointer, self.checkpointer = self.checkpointer, None
+        try:
+            self.schedule_classes()
+            payload, penalty = self.encode_schedule(), self.total_penalty()
+            self.clear_schedule()
+            self.decode_schedule(start)
+            self.schedule_classes()
+        finally:
+            self.checkpointer = checkpointer
+        if self.total_penalty() > penalty:
+            self.clear_schedule()
+            self.decode_schedule(payload)
+
+    def initialize_schedule(self):
+        # Generate daily periods
+        self.generate_daily_periods()
+
+        # Initialize availability: every resource starts free in every slot. The bitsets share one all-free int
+        # and each FreeSlotIndex stays unmaterialized until used, so no work is done per resource and slot
+        num_slots = self.weeks * DAYS_PER_WEEK * PERIODS_PER_DAY
+        self.group_entities = self.groups + [subgroup for group in self.groups for subgroup in group.subgroup_entities]
+        group_names = [group.name for group in self.group_entities]
+        self.lecturer_availability = ResourceAvailability([lecturer.name for lecturer in self.lecturers], num_slots)
+        self.group_availability = ResourceAvailability(group_names, num_slots)
+        self.room_availability = ResourceAvailability([room.name for room in self.rooms_by_capacity], num_slots)
+        self.group_free_slots = {name: FreeSlotIndex(range(num_slots)) for name in group_names}
+        self.schedule = ScheduleStore(num_slots)
+        if self.scorer is not None:
+            self.scorer.evaluate()
 
     def schedule_classes(self):
         schedule_changed = True
         while schedule_changed:
             schedule_changed = False
+            sweep_start = time.perf_counter() if self.stats else None
             for class_type in ['Lecture', 'Practical']:
                 for group in self.groups:
                     for subject_name, sa in group.subjects.items():
-                        subject = sa.subject
-                        if class_type == 'Lecture':
-                            hours_needed = sa.lecture_hours - sa.lecture_hours_scheduled
-                        else:
-                            hours_needed = sa.practical_hours - sa.practical_hours_scheduled
-                        if hours_needed <= 0:
-                            continue
-                        if class_type == 'Practical' and subject.requires_subgroups:
-                            practical_hours_per_subgroup = sa.practical_hours / len(group.subgroups)
-                            for subgroup_name in group.subgroups:
-                                subgroup = Group(subgroup_name, group.num_students // 2)
-                                sub_sa = self.group_subject_assignments[subgroup_name].get(subject_name)
-                                if not sub_sa:
-                                    sub_sa = SubjectAssignment(subject, 0, practical_hours_per_subgroup)
-                                    self.group_subject_assignments[subgroup_name][subject_name] = sub_sa
-                                sub_hours_needed = sub_sa.practical_hours - sub_sa.practical_hours_scheduled
-                                while sub_hours_needed > 0:
-                                    success = self.schedule_class(subgroup, subject, class_type, main_group=group)
-                                    if success:
-                                        schedule_changed = True
-                                        sub_hours_needed -= 1.5
-                                    else:
-                                        break
-                        else:
-                            while hours_needed > 0:
-                                success = self.schedule_class(group, subject, class_type)
-                                if success:
-                                    schedule_changed = True
-                                    hours_needed -= 1.5
-                                else:
-                                    break
+                        if self.fill_assignment(group, sa, class_type):
+                            schedule_changed = True
+            if self.stats:
+                sweep_seconds = time.perf_counter() - sweep_start
+                self.stats.sweep_seconds.append(sweep_seconds)
+                self.stats.phase_seconds['schedule_classes'] += sweep_seconds
+            if self.checkpointer is not None:
+                self.checkpointer.maybe('schedule_classes', changed=schedule_changed)
+
+    def fill_assignment(self, group, sa, class_type):
+        # Place classes of one type for one assignment until its hours are covered or nothing fits;
+        # returns True if anything was placed
+        schedule_changed = False
+        subject = sa.subject
+        if class_type == 'Lecture':
+            hours_needed = sa.lecture_hours - sa.lecture_hours_scheduled
+        else:
+            hours_needed = sa.practical_hours - sa.practical_hours_scheduled
+        if hours_needed <= 0:
+            return False
+        if class_type == 'Practical' and subject.requires_subgroups:
+            for subgroup in self.subgroups_of(group):
+                sub_sa = self.subgroup_assignment(subgroup, subject)
+                sub_hours_needed = sub_sa.practical_hours - sub_sa.practical_hours_scheduled
+                while sub_hours_needed > 0:
+                    success = self.schedule_class(subgroup, subject, class_type, main_group=group)
+                    if success:
+                        schedule_changed = True
+                        sub_hours_needed -= 1.5
+                    else:
+                        break
+        else:
+            while hours_needed > 0:
+                success = self.schedule_class(group, subject, class_type)
+                if success:
+                    schedule_changed = True
+                    hours_needed -= 1.5
+                else:
+                    break
+        return schedule_changed
+
+    def reschedule(self, blocked_lecturers=None, closed_rooms=(), hour_changes=()):
+        # Apply an operational change to a finished schedule, keeping every unaffected class where it is.
+        #   blocked_lecturers: lecturer name -> slot IDs the lecturer can no longer teach in
+        #   closed_rooms: names of rooms that are no longer available at all
+        #   hour_changes: (group name, subject name, lecture hours, practical hours) tuples
+        # Classes hit by the change first try a substitute lecturer or room in the same slot; only the rest
+        # are removed, and the affected assignments are then topped up again. Returns the classes removed.
+        affected = set()  # (Main group name, subject name, class type)
+        removed = 0
+        for lecturer_name, slots in (blocked_lecturers or {}).items():
+            lecturer_id = self.lecturer_availability.id_of(lecturer_name)
+            blocked = set(slots)
+            for record in [r for r in self.schedule.for_lecturer(lecturer_id) if r.slot in blocked]:
+                key = (self.class_subject(record).name, self.class_type(record))
+                substitutes = [other for other in self.subject_lecturers.get(key, [])
+                               if other != lecturer_id and self.lecturer_availability.is_free(other, record.slot)]
+                if substitutes:
+                    self.change_lecturer(record, self.rng.choice(substitutes))
+                else:
+                    affected.update(self.unplace(record))
+                    removed += 1
+            for slot in blocked:
+                self.lecturer_availability.reserve(lecturer_id, slot)
+
+        for room_name in closed_rooms:
+            room_id = self.room_availability.id_of(room_name)
+            for record in self.schedule.for_room(room_id):
+                substitutes = [room for room in self.free_rooms(record.slot, record.total_students) if room.name != room_name]
+                if substitutes:
+                    self.change_room(record, substitutes[0])
+                else:
+                    affected.update(self.unplace(record))
+                    removed += 1
+            for slot in range(self.room_availability.num_slots):
+                self.room_availability.reserve(room_id, slot)
+
+        for group_name, subject_name, lecture_hours, practical_hours in hour_changes:
+            group = self.groups_by_name[group_name]
+            sa = group.subjects[subject_name]
+            sa.lecture_hours = lecture_hours
+            sa.practical_hours = practical_hours
+            for subgroup in group.subgroup_entities:
+                sub_sa = subgroup.subjects.get(subject_name)
+                if sub_sa:
+                    sub_sa.practical_hours = practical_hours / len(group.subgroups)
+            removed += self.trim_assignment(group, sa)
+            affected.add((group_name, subject_name, 'Lecture'))
+            affected.add((group_name, subject_name, 'Practical'))
+
+        # Re-place until the affected assignments stop changing, as schedule_classes does for the full term
+        schedule_changed = True
+        while schedule_changed:
+            schedule_changed = False
+            for group_name, subject_name, class_type in sorted(affected):
+                group = self.groups_by_name[group_name]
+                if self.fill_assignment(group, group.subjects[subject_name], class_type):
+                    schedule_changed = True
+        if self.scorer is not None and hour_changes:
+            self.scorer.evaluate()  # Required hours changed underneath the incremental hours term
+        return removed
+
+    def unplace(self, record):
+        # Remove a class and report the (main group, subject, type) assignments that lost hours
+        subject_name = self.class_subject(record).name
+        class_type = self.class_type(record)
+        main_group = self.class_main_group(record)
+        owners = [main_group.name] if main_group else self.class_group_names(record)
+        self.remove_class(record)
+        return [(group_name, subject_name, class_type) for group_name in owners]
+
+    def trim_assignment(self, group, sa):
+        # Drop the group's latest classes of the subject until no counter exceeds its (possibly lowered) hours
+        removed = 0
+        subject_id = self.subject_ids[sa.subject.name]
+        records = [r for r in self.schedule.for_group(self.group_availability.id_of(group.name)) if r.subject_id == subject_id]
+        for record in reversed(records):
+            if record.type_id == LECTURE:
+                if sa.lecture_hours_scheduled <= sa.lecture_hours:
+                    continue
+                if len(record.group_ids) > 1:
+                    self.leave_class(record, group)
+                else:
+                    self.remove_class(record)
+                    removed += 1
+            else:
+                sub_sa = None
+                if record.main_group_id >= 0:
+                    sub_sa = self.group_subject_assignments[self.class_group_names(record)[0]][sa.subject.name]
+                if sa.practical_hours_scheduled <= sa.practical_hours and (
+                        sub_sa is None or sub_sa.practical_hours_scheduled <= sub_sa.practical_hours):
+                    continue
+                self.remove_class(record)
+                removed += 1
+        return removed
 
     def schedule_class(self, group, subject, class_type, main_group=None):
-        random.shuffle(self.time_slots)  # Shuffle to distribute classes more evenly
-        for week, day, period_index in self.time_slots:
-            period_info = next((p for p in self.daily_periods[day] if p['period_index'] == period_index), None)
-            if not period_info:
+        stats = self.stats
+        lecturer_ids = self.subject_lecturers.get((subject.name, class_type), [])
+        candidates = self.candidate_slots(group, lecturer_ids, main_group)
+        if not candidates:
+            if stats:
+                stats.rejections['no_candidate_slot'] += 1
+                stats.record_call(0, False)
+            return False
+        free_rooms = self.free_rooms if stats is None else stats.timed(self.free_rooms, 'room_search')
+        probes = 0
+        # Draw the group's free slots in random order to distribute classes evenly
+        for probes, slot in enumerate(self.group_free_slots[group.name].iter_random(self.rng), 1):
+            # Main group and lecturer availability are covered by the candidate bitset
+            if not candidates >> slot & 1:
+                if stats:
+                    stats.rejections[self.candidate_miss_reason(main_group, slot)] += 1
                 continue
-            # Check group availability
-            if not self.group_availability[group.name][week][day][period_index]:
-                continue
-            if main_group and not self.group_availability[main_group.name][week][day][period_index]:
-                continue  # Ensure main group is available when scheduling subgroups
 
             # Find eligible lecturers
-            eligible_lecturers = [lecturer for lecturer in self.lecturers
-                                  if subject.name in lecturer.can_teach_subjects and class_type in lecturer.can_conduct
-                                  and self.lecturer_availability[lecturer.name][week][day][period_index]]
-
-            if not eligible_lecturers:
-                continue
+            eligible_lecturers = [lecturer_id for lecturer_id in lecturer_ids
+                                  if self.lecturer_availability.is_free(lecturer_id, slot)]
 
-            lecturer = random.choice(eligible_lecturers)
+            lecturer_id = self.rng.choice(eligible_lecturers)
 
             sa = self.group_subject_assignments[group.name][subject.name]
 
@@ -317,12 +1266,12 @@ class Scheduler:
                 if main_group is None:
                     # This is a lecture for the main group (could be combined with other groups)
                     combined_groups = [group]
-                    for other_group in self.groups:
+                    for other_group in self.subject_groups[subject.name]:
                         if other_group.name == group.name:
                             continue
                         sa_other = other_group.subjects.get(subject.name)
                         if sa_other and sa_other.lecture_hours_scheduled + 1.5 <= sa_other.lecture_hours:
-                            if self.group_availability[other_group.name][week][day][period_index]:
+                            if self.group_availability.is_free(self.group_availability.id_of(other_group.name), slot):
                                 combined_groups.append(other_group)
                     # Before scheduling, ensure none of the combined groups would exceed their required hours
                     over_schedule = False
@@ -332,36 +1281,23 @@ class Scheduler:
                             over_schedule = True
                             break
                     if over_schedule:
+                        if stats:
+                            stats.rejections['over_schedule'] += 1
                         continue  # Cannot schedule as it would over-schedule one of the groups
                     # Find suitable room
                     total_students = sum(g.num_students for g in combined_groups)
-                    suitable_rooms = [room for room in self.rooms if
-                                      self.room_availability[room.name][week][day][period_index] and room.capacity >= total_students]
+                    suitable_rooms = free_rooms(slot, total_students)
                     if not suitable_rooms:
-                        continue
-                    room = suitable_rooms[self.room_assignment_index % len(suitable_rooms)]
-                    self.room_assignment_index += 1
-                    # Schedule the class
-                    class_info = {
-                        'Groups': [g.name for g in combined_groups],
-                        'Subject': subject.name,
-                        'Lecturer': lecturer.name,
-                        'Room': room.name,
-                        'Type': class_type,
-                        'Day': day,
-                        'PeriodIndex': period_index,
-                        'Week': week,
-                        'TotalStudents': total_students,
-                        'RoomCapacity': room.capacity
-                    }
-                    self.schedule[(week, day, period_index)].append(class_info)
-                    # Update availability
-                    self.lecturer_availability[lecturer.name][week][day][period_index] = False
-                    self.room_availability[room.name][week][day][period_index] = False
-                    for g in combined_groups:
-                        self.group_availability[g.name][week][day][period_index] = False
-                        sa_g = self.group_subject_assignments[g.name][subject.name]
-                        sa_g.lecture_hours_scheduled += 1.5
+                        room = self.rematch_rooms(slot, total_students)
+                        if room is None:
+                            if stats:
+                                stats.rejections['no_room'] += 1
+                            continue
+                    else:
+                        room = suitable_rooms[0]  # Best fit keeps large rooms for combined lectures
+                    self.place_class(combined_groups, subject, class_type, lecturer_id, room, slot)
+                    if stats:
+                        stats.record_call(probes, True)
                     return True
                 else:
                     # Should not reach here
@@ -369,54 +1305,50 @@ class Scheduler:
             else:
                 # For practicals, check if scheduling would exceed required hours
                 if sa.practical_hours_scheduled + 1.5 > sa.practical_hours:
+                    if stats:
+                        stats.rejections['over_schedule'] += 1
                     continue  # Skip to prevent over-scheduling
                 # For subgroups, also check main group's practical hours
                 if main_group:
                     main_sa = self.group_subject_assignments[main_group.name][subject.name]
                     if main_sa.practical_hours_scheduled + 1.5 > main_sa.practical_hours:
+                        if stats:
+                            stats.rejections['over_schedule'] += 1
                         continue  # Skip to prevent over-scheduling
                 # Find suitable room
-                num_students = group.num_students
-                suitable_rooms = [room for room in self.rooms if
-                                  self.room_availability[room.name][week][day][period_index] and room.capacity >= num_students]
-                if not suitable_rooms:
-                    continue
-                room = suitable_rooms[self.room_assignment_index % len(suitable_rooms)]
-                self.room_assignment_index += 1
-                # Schedule the class
-                class_info = {
-                    'Groups': [group.name],
-                    'Subject': subject.name,
-                    'Lecturer': lecturer.name,
-                    'Room': room.name,
-                    'Type': class_type,
-                    'Day': day,
-                    'PeriodIndex': period_index,
-                    'Week': week,
-                    'TotalStudents': num_students,
-                    'RoomCapacity': room.capacity
-                }
-                self.schedule[(week, day, period_index)].append(class_info)
-                # Update availability
-                self.lecturer_availability[lecturer.name][week][day][period_index] = False
-                self.room_availability[room.name][week][day][period_index] = False
-                self.group_availability[group.name][week][day][period_index] = False
-                if main_group:
-                    self.group_availability[main_group.name][week][day][period_index] = False
-                # Update scheduled practical hours
-                sa.practical_hours_scheduled += 1.5
-                if main_group:
-                    main_sa = self.group_subject_assignments[main_group.name][subject.name]
-                    main_sa.practical_hours_scheduled += 1.5
+                suitable_rooms = free_rooms(slot, group.num_students)
+                if suitable_rooms:
+                    room = suitable_rooms[0]
+                else:
+                    room = self.rematch_rooms(slot, group.num_students)
+                    if room is None:
+                        if stats:
+                            stats.rejections['no_room'] += 1
+                        continue
+                self.place_class([group], subject, class_type, lecturer_id, room, slot, main_group)
+                if stats:
+                    stats.record_call(probes, True)
                 return True
+        if stats:
+            stats.record_call(probes, False)
         return False
 
-    def print_schedule(self):
+    def candidate_miss_reason(self, main_group, slot):
+        # Why a free slot of the group was outside the candidate bitset (only asked while stats are on)
+        if main_group and not self.group_availability.is_free(self.group_availability.id_of(main_group.name), slot):
+            return 'main_group_busy'
+        return 'no_lecturer'
+
+    def print_schedule(self, out=None):
+        # Stream the timetable text through one buffered writelines call instead of a print per line
+        (out or sys.stdout).writelines(self.iter_schedule_lines())
+
+    def iter_schedule_lines(self):
         days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday']
-        for week in range(SEMESTER_WEEKS):
-            print(f"\nWeek {week+1}:")
+        for week in range(self.weeks):
+            yield f"\nWeek {week+1}:\n"
             for day_index in range(DAYS_PER_WEEK):
-                print(f"  {days[day_index]}:")
+                yield f"  {days[day_index]}:\n"
                 periods = self.daily_periods[day_index]
                 for period in periods:
                     period_index = period['period_index']
@@ -424,17 +1356,16 @@ class Scheduler:
                     end_time = period['end_time']
                     start_time_str = f"{start_time // 60}:{start_time % 60:02d}"
                     end_time_str = f"{end_time // 60}:{end_time % 60:02d}"
-                    classes = self.schedule.get((week, day_index, period_index), [])
+                    classes = self.schedule.in_slot(self.slot_id(week, day_index, period_index))
                     if classes:
-                        print(f"    Period {period_index + 1} ({start_time_str}-{end_time_str}):")
-                        for class_info in classes:
-                            groups_str = ', '.join(class_info['Groups'])
-                            lecturer_name = class_info['Lecturer']
-                            total_students = class_info['TotalStudents']
-                            room_capacity = class_info['RoomCapacity']
-                            print(f"      {class_info['Type']} - {class_info['Subject']} - Groups: {groups_str}")
-                            print(f"        Lecturer: {lecturer_name}")
-                            print(f"        Room: {class_info['Room']} (Capacity: {room_capacity}) - Total Students: {total_students}")
+                        yield f"    Period {period_index + 1} ({start_time_str}-{end_time_str}):\n"
+                        for record in classes:
+                            groups_str = ', '.join(self.class_group_names(record))
+                            lecturer_name = self.class_lecturer(record).name
+                            room = self.class_room(record)
+                            yield f"      {self.class_type(record)} - {self.class_subject(record).name} - Groups: {groups_str}\n"
+                            yield f"        Lecturer: {lecturer_name}\n"
+                            yield f"        Room: {room.name} (Capacity: {room.capacity}) - Total Students: {record.total_students}\n"
 
     def print_group_programs(self):
         print("\nGroup Programs and Fulfillment:")
@@ -449,7 +1380,7 @@ class Scheduler:
                 print(f"    Lectures: {lecture_status} hours (Difference: {lecture_diff})")
                 print(f"    Practicals: {practical_status} hours (Difference: {practical_diff})")
 
-    def calculate_penalties(self):
+    def total_penalty(self):
         total_penalty = 0
         for group in self.groups:
             for subject_name, sa in group.subjects.items():
@@ -457,7 +1388,12 @@ class Scheduler:
                 practical_diff = sa.practical_hours_scheduled - sa.practical_hours
                 penalty = abs(lecture_diff) + abs(practical_diff)
                 total_penalty += penalty
+        return total_penalty
+
+    def calculate_penalties(self):
+        total_penalty = self.total_penalty()
         print(f"\nTotal scheduling penalty (sum of differences in hours): {total_penalty}")
+        return total_penalty
 
     def print_lecturer_assignments(self):
         print("\nLecturer Assignments:")
@@ -494,6 +1430,25 @@ class Scheduler:
         # Print lecturer assignments
         self.print_lecturer_assignments()
 
+def run_seeded_schedule(seed, engine='greedy'):
+    # One multi-start run; returns its penalty and the schedule in encode_schedule format
+    scheduler = Scheduler(seed)
+    scheduler.load_data()
+    scheduler.create_schedule(engine)
+    return seed, scheduler.total_penalty(), scheduler.encode_schedule()
+
+def multi_start_schedule(num_runs, base_seed=0, engine='greedy', max_workers=None):
+    # Run independently seeded schedules across a process pool and keep the lowest-penalty one
+    seeds = [base_seed + i for i in range(num_runs)]
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        results = list(executor.map(run_seeded_schedule, seeds, [engine] * num_runs))
+    seed, penalty, payload = min(results, key=lambda result: (result[1], result[0]))
+    scheduler = Scheduler(seed)
+    scheduler.load_data()
+    scheduler.initialize_schedule()
+    scheduler.decode_schedule(payload)
+    return scheduler
+
 if __name__ == "__main__":
     scheduler = Scheduler()
     scheduler.main()
@@ -0,0 +1,143 @@
+from array import array
+
+from main import DAYS_PER_WEEK, LECTURE, PERIODS_PER_DAY
+
+# Scoring Constants
+HARD_TERMS = ('hours', 'capacity')  # Hour-difference penalty, students seated beyond room capacity
+SOFT_TERMS = ('gaps', 'lecturer_load', 'room_waste')  # Free periods inside a group's day, lecturer classes per day
+                                                      # beyond the limit, empty seats in used rooms
+TERMS = HARD_TERMS + SOFT_TERMS
+DEFAULT_WEIGHTS = {'hours': 1.0, 'capacity': 100.0, 'gaps': 0.5, 'lecturer_load': 0.5, 'room_waste': 0.01}
+HOURS_ONLY_WEIGHTS = {'hours': 1.0}  # Reproduces Scheduler.total_penalty exactly
+LECTURER_DAILY_LIMIT = 2  # Classes per day a lecturer can teach without penalty
+
+DAY_MASK = (1 << PERIODS_PER_DAY) - 1
+
+def gap_count(pattern):
+    # Free periods between the first and last busy period of a day bitmask
+    if not pattern:
+        return 0
+    first = (pattern & -pattern).bit_length() - 1
+    last = pattern.bit_length() - 1
+    return (last - first + 1) - pattern.bit_count()
+
+GAP_TABLE = [gap_count(pattern) for pattern in range(1 << PERIODS_PER_DAY)]
+LOAD_TABLE = [max(0, pattern.bit_count() - LECTURER_DAILY_LIMIT) for pattern in range(1 << PERIODS_PER_DAY)]
+
+class ScheduleArrays:
+    # Columnar snapshot of a ScheduleStore: one int array per record field, group IDs flattened with offsets
+    def __init__(self, scheduler):
+        self.slot = array('i')
+        self.lecturer = array('i')
+        self.room_capacity = array('i')
+        self.total_students = array('i')
+        self.group_offsets = array('i', [0])
+        self.group_ids = array('i')
+        for record in scheduler.schedule:
+            self.slot.append(record.slot)
+            self.lecturer.append(record.lecturer_id)
+            self.room_capacity.append(scheduler.room_capacities[record.room_id])
+            self.total_students.append(record.total_students)
+            self.group_ids.extend(scheduler.schedule.occupied(record))
+            self.group_offsets.append(len(self.group_ids))
+
+class Scorer:
+    # Weighted hard/soft penalty over a Scheduler's schedule.
+    # evaluate() recomputes every term in bulk from ScheduleArrays; once attached with Scheduler.attach_scorer
+    # the placement primitives report each change, so the terms (and total()) stay current in O(1) per change.
+    def __init__(self, scheduler, weights=None):
+        self.scheduler = scheduler
+        self.weights = dict(DEFAULT_WEIGHTS if weights is None else weights)
+        unknown = set(self.weights) - set(TERMS)
+        if unknown:
+            raise ValueError(f"Unknown scoring terms: {', '.join(sorted(unknown))}")
+        self.terms = dict.fromkeys(TERMS, 0.0)
+        self.group_busy = {}  # Group ID -> bitset of occupied slots
+        self.lecturer_busy = {}  # Lecturer ID -> bitset of teaching slots
+
+    def evaluate(self):
+        sched = self.scheduler
+        columns = ScheduleArrays(sched)
+        self.group_busy = dict.fromkeys(range(len(sched.group_availability.names)), 0)
+        self.lecturer_busy = dict.fromkeys(range(len(sched.lecturers)), 0)
+        for index, slot in enumerate(columns.slot):
+            bit = 1 << slot
+            self.lecturer_busy[columns.lecturer[index]] |= bit
+            for position in range(columns.group_offsets[index], columns.group_offsets[index + 1]):
+                self.group_busy[columns.group_ids[position]] |= bit
+
+        required = array('d')
+        scheduled = array('d')
+        for group in sched.groups:
+            for sa in group.subjects.values():
+                required.extend((sa.lecture_hours, sa.practical_hours))
+                scheduled.extend((sa.lecture_hours_scheduled, sa.practical_hours_scheduled))
+        self.terms['hours'] = sum(map(abs, map(float.__sub__, scheduled, required)))
+        self.terms['capacity'] = float(sum(max(0, t - c) for t, c in zip(columns.total_students, columns.room_capacity)))
+        self.terms['room_waste'] = float(sum(max(0, c - t) for t, c in zip(columns.total_students, columns.room_capacity)))
+        self.terms['gaps'] = float(sum(map(self.day_sum_gaps, self.group_busy.values())))
+        self.terms['lecturer_load'] = float(sum(map(self.day_sum_load, self.lecturer_busy.values())))
+        return dict(self.terms)
+
+    def day_sum_gaps(self, busy):
+        return sum(GAP_TABLE[busy >> (day * PERIODS_PER_DAY) & DAY_MASK] for day in range(self.scheduler.weeks * DAYS_PER_WEEK))
+
+    def day_sum_load(self, busy):
+        return sum(LOAD_TABLE[busy >> (day * PERIODS_PER_DAY) & DAY_MASK] for day in range(self.scheduler.weeks * DAYS_PER_WEEK))
+
+    def total(self, terms=None):
+        terms = self.terms if terms is None else terms
+        return sum(weight * terms[term] for term, weight in self.weights.items())
+
+    # Incremental updates, called by the Scheduler placement primitives
+
+    def add(self, record):
+        self.apply(record.slot, record.lecturer_id, self.scheduler.room_capacities[record.room_id],
+                   record.total_students, self.scheduler.schedule.occupied(record), 1)
+
+    def remove(self, record):
+        self.apply(record.slot, record.lecturer_id, self.scheduler.room_capacities[record.room_id],
+                   record.total_students, self.scheduler.schedule.occupied(record), -1)
+
+    def hours_changed(self, group_name, sa, type_id, change):
+        # Counters were already moved by `change`; only main groups' assignments are scored
+        if group_name not in self.scheduler.groups_by_name:
+            return
+        if type_id == LECTURE:
+            required, scheduled = sa.lecture_hours, sa.lecture_hours_scheduled
+        else:
+            required, scheduled = sa.practical_hours, sa.practical_hours_scheduled
+        self.terms['hours'] += abs(scheduled - required) - abs(scheduled - change - required)
+
+    def apply(self, slot, lecturer_id, capacity, total_students, group_ids, sign):
+        terms = self.terms
+        for term, change in self.resource_deltas(slot, lecturer_id, capacity, total_students, group_ids, sign).items():
+            terms[term] += change
+        bit = 1 << slot
+        if sign > 0:
+            self.lecturer_busy[lecturer_id] |= bit
+            for group_id in group_ids:
+                self.group_busy[group_id] |= bit
+        else:
+            self.lecturer_busy[lecturer_id] &= ~bit
+            for group_id in group_ids:
+                self.group_busy[group_id] &= ~bit
+
+    def resource_deltas(self, slot, lecturer_id, capacity, total_students, group_ids, sign):
+        # Term changes from adding (sign 1) or removing (sign -1) one class, computed on its day only
+        day, period = divmod(slot, PERIODS_PER_DAY)
+        shift = day * PERIODS_PER_DAY
+        period_bit = 1 << period
+        gaps = 0
+        for group_id in group_ids:
+            before = self.group_busy[group_id] >> shift & DAY_MASK
+            after = before | period_bit if sign > 0 else before & ~period_bit
+            gaps += GAP_TABLE[after] - GAP_TABLE[before]
+        before = self.lecturer_busy[lecturer_id] >> shift & DAY_MASK
+        after = before | period_bit if sign > 0 else before & ~period_bit
+        return {
+            'gaps': gaps,
+            'lecturer_load': LOAD_TABLE[after] - LOAD_TABLE[before],
+            'capacity': sign * max(0, total_students - capacity),
+            'room_waste': sign * max(0, capacity - total_students),
+        }
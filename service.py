@@ -0,0 +1,323 @@
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import main
+from exporters import EXPORT_COLUMNS, iter_entries
+
+# Service Constants
+SERVICE_HOST = '127.0.0.1'  # Local only; the service has no authentication
+SERVICE_PORT = 8765
+MAX_RUNNING_JOBS = 2  # Jobs scheduled at once; later submissions wait in the queue
+DEFAULT_JOB = {'seed': 0, 'engine': 'greedy', 'weekly_pattern': False, 'improve': 0.0}
+FINISHED_STATES = ('done', 'failed', 'cancelled')
+
+# Usage, with one sub-directory of CSVs per faculty under --root:
+#   python service.py --root faculties
+#   curl -X POST localhost:8765/jobs -d '{"faculty": "physics", "improve": 5}'
+#   curl localhost:8765/jobs/1/events      (progress as JSON lines until the job finishes)
+#   curl localhost:8765/jobs/1/schedule    (one JSON object per class, EXPORT_COLUMNS keys)
+#   curl -X DELETE localhost:8765/jobs/1
+
+_catalogues = {}  # Per worker process: faculty directory -> (file stamps, parsed rows of each DATA_FILES entry)
+
+def faculty_rows(scheduler, directory):
+    # Parsed CSV rows of a faculty, kept warm across jobs until any of its files changes
+    paths = [os.path.join(directory, filename) for filename in main.DATA_FILES]
+    key = tuple((os.stat(path).st_mtime_ns, os.stat(path).st_size) for path in paths)
+    cached = _catalogues.get(directory)
+    if cached is None or cached[0] != key:
+        cached = (key, tuple(list(scheduler.iter_csv_rows(path)) for path in paths))
+        _catalogues[directory] = cached
+    return cached[1]
+
+def run_job(job_id, directory, spec, events, cancel):
+    # Worker-process side of a job: progress goes to the shared events queue, cancellation is checked between
+    # phases and at every local-search sample. Returns the result, or None when cancelled
+    def emit(event, **data):
+        events.put(dict(data, job=job_id, event=event))
+
+    try:
+        scheduler = main.Scheduler(spec['seed'])
+        scheduler.load_rows(*faculty_rows(scheduler, directory))
+        emit('loaded', groups=len(scheduler.groups), lecturers=len(scheduler.lecturers), rooms=len(scheduler.rooms))
+        if cancel.is_set():
+            return None
+        scheduler.create_schedule(spec['engine'], weekly_pattern=spec['weekly_pattern'])
+        emit('scheduled', penalty=scheduler.total_penalty(), classes=len(scheduler.schedule))
+        if spec['improve'] > 0 and not cancel.is_set():
+            def progress(seconds, penalty):
+                emit('improving', seconds=round(seconds, 3), penalty=penalty)
+                return not cancel.is_set()
+            scheduler.improve_schedule(spec['improve'], progress)
+            emit('improved', penalty=scheduler.total_penalty(), classes=len(scheduler.schedule))
+        if cancel.is_set():
+            return None
+        return {
+            'penalty': scheduler.total_penalty(),
+            'classes': len(scheduler.schedule),
+            'schedule': [list(entry) for entry in iter_entries(scheduler)],
+        }
+    finally:
+        emit('drained')
+
+class Job:
+    def __init__(self, job_id, faculty, spec):
+        self.id = job_id
+        self.faculty = faculty
+        self.spec = spec
+        self.state = 'queued'
+        self.events = []  # Every progress event so far, replayed to late subscribers
+        self.result = None
+        self.error = None
+        self.cancel = None  # Manager Event, created when the job starts running
+        self.cancel_requested = False
+        self.drained = asyncio.Event()  # Set once the worker's last event has been published
+        self.updated = asyncio.Event()
+
+    def publish(self, event):
+        self.events.append(event)
+        self.updated.set()
+        self.updated = asyncio.Event()
+
+    def set_state(self, state, **data):
+        self.state = state
+        self.publish(dict(data, job=self.id, event=state))
+
+    def summary(self):
+        summary = {'id': self.id, 'faculty': self.faculty, 'state': self.state, 'spec': self.spec}
+        if self.events:
+            summary['last_event'] = self.events[-1]
+        if self.result is not None:
+            summary['penalty'] = self.result['penalty']
+            summary['classes'] = self.result['classes']
+        if self.error is not None:
+            summary['error'] = self.error
+        return summary
+
+class SchedulingService:
+    # Job queue over a process pool. Each worker keeps the catalogues it has parsed, so repeated jobs for a faculty
+    # skip CSV parsing; MAX_RUNNING_JOBS bounds how many jobs compete for the workers at once.
+    def __init__(self, root, workers=None, max_running=MAX_RUNNING_JOBS):
+        self.root = os.path.abspath(root)
+        self.workers = workers or os.cpu_count()
+        self.max_running = max_running
+        self.jobs = {}
+        self.job_ids = itertools.count(1)
+        self.executor = None
+        self.manager = None
+        self.events = None
+        self.running = None
+        self.pump_task = None
+
+    async def start(self):
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.manager = multiprocessing.Manager()
+        self.events = self.manager.Queue()
+        self.running = asyncio.Semaphore(self.max_running)
+        self.pump_task = asyncio.create_task(self.pump())
+
+    async def stop(self):
+        for job in self.jobs.values():
+            self.cancel(job)
+        self.events.put(None)
+        await self.pump_task
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.manager.shutdown()
+
+    async def pump(self):
+        # Move worker events from the manager queue onto their jobs
+        loop = asyncio.get_running_loop()
+        while True:
+            event = await loop.run_in_executor(None, self.events.get)
+            if event is None:
+                return
+            job = self.jobs.get(event['job'])
+            if job is None:
+                continue
+            if event['event'] == 'drained':
+                job.drained.set()
+            else:
+                job.publish(event)
+
+    def faculties(self):
+        return sorted(name for name in os.listdir(self.root)
+                      if all(os.path.isfile(os.path.join(self.root, name, filename)) for filename in main.DATA_FILES))
+
+    def submit(self, request):
+        faculty = request.get('faculty')
+        if faculty not in self.faculties():
+            raise ValueError(f"Unknown faculty: {faculty}")
+        unknown = set(request) - set(DEFAULT_JOB) - {'faculty'}
+        if unknown:
+            raise ValueError(f"Unknown job options: {', '.join(sorted(unknown))}")
+        spec = dict(DEFAULT_JOB)
+        spec.update((key, value) for key, value in request.items() if key in DEFAULT_JOB)
+        if spec['engine'] not in ('greedy', 'cp'):
+            raise ValueError(f"Unknown scheduling engine: {spec['engine']}")
+        try:
+            spec['seed'] = int(spec['seed'])
+            spec['improve'] = float(spec['improve'])
+        except (TypeError, ValueError):
+            # JSON lists, objects and null fail int()/float() with TypeError
+            raise ValueError(f"Invalid seed or improve: {spec['seed']!r}, {spec['improve']!r}") from None
+        if not isinstance(spec['weekly_pattern'], bool):
+            # bool() would read "false", "no" and "0" as True
+            raise ValueError(f"weekly_pattern must be true or false: {spec['weekly_pattern']!r}")
+        job = Job(next(self.job_ids), faculty, spec)
+        self.jobs[job.id] = job
+        job.set_state('queued')
+        asyncio.create_task(self.run(job))
+        return job
+
+    async def run(self, job):
+        async with self.running:
+            if job.cancel_requested:
+                return
+            loop = asyncio.get_running_loop()
+            job.cancel = await loop.run_in_executor(None, self.manager.Event)
+            if job.cancel_requested:
+                return
+            job.set_state('running')
+            directory = os.path.join(self.root, job.faculty)
+            try:
+                result = await loop.run_in_executor(self.executor, run_job, job.id, directory, job.spec,
+                                                    self.events, job.cancel)
+            except Exception as error:
+                if not isinstance(error, BrokenProcessPool):
+                    await job.drained.wait()
+                job.error = f"{type(error).__name__}: {error}"
+                job.set_state('failed', error=job.error)
+                return
+            await job.drained.wait()
+            if result is None:
+                job.set_state('cancelled')
+            else:
+                job.result = result
+                job.set_state('done', penalty=result['penalty'], classes=result['classes'])
+
+    def cancel(self, job):
+        if job.state in FINISHED_STATES:
+            return False
+        job.cancel_requested = True
+        if job.state == 'queued':
+            # Never started, so nothing to wait for: run() skips it when its turn comes
+            job.set_state('cancelled')
+        elif job.cancel is not None:
+            job.cancel.set()
+        return True
+
+    # HTTP front end: one request per connection, JSON bodies, progress streamed as JSON lines
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode('latin-1')
+            method, target, _ = request_line.split(' ', 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+            await self.route(method, target.split('?', 1)[0], body, writer)
+        except (ValueError, asyncio.IncompleteReadError) as error:
+            await self.respond(writer, 400, {'error': str(error)})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method, path, body, writer):
+        parts = [part for part in path.split('/') if part]
+        if parts == ['faculties'] and method == 'GET':
+            return await self.respond(writer, 200, self.faculties())
+        if parts == ['jobs'] and method == 'GET':
+            return await self.respond(writer, 200, [job.summary() for job in self.jobs.values()])
+        if parts == ['jobs'] and method == 'POST':
+            request = json.loads(body or b'{}')
+            if not isinstance(request, dict):
+                raise ValueError("Job request must be a JSON object")
+            return await self.respond(writer, 202, self.submit(request).summary())
+        job = self.jobs.get(int(parts[1])) if len(parts) >= 2 and parts[0] == 'jobs' and parts[1].isdigit() else None
+        if job is None:
+            return await self.respond(writer, 404, {'error': f"Not found: {path}"})
+        if len(parts) == 2 and method == 'GET':
+            return await self.respond(writer, 200, job.summary())
+        if len(parts) == 2 and method == 'DELETE':
+            if not self.cancel(job):
+                return await self.respond(writer, 409, {'error': f"Job {job.id} already {job.state}"})
+            return await self.respond(writer, 202, job.summary())
+        if parts[2:] == ['events'] and method == 'GET':
+            return await self.stream_events(job, writer)
+        if parts[2:] == ['schedule'] and method == 'GET':
+            if job.result is None:
+                return await self.respond(writer, 409, {'error': f"Job {job.id} is {job.state}"})
+            await self.send_head(writer, 200, 'application/x-ndjson')
+            writer.write(b''.join(json.dumps(dict(zip(EXPORT_COLUMNS, entry))).encode() + b'\n'
+                                  for entry in job.result['schedule']))
+            return await writer.drain()
+        return await self.respond(writer, 405, {'error': f"{method} not allowed on {path}"})
+
+    async def stream_events(self, job, writer):
+        # Replay the job's events so far, then follow it until it finishes
+        await self.send_head(writer, 200, 'application/x-ndjson')
+        sent = 0
+        while True:
+            updated = job.updated
+            for event in job.events[sent:]:
+                writer.write(json.dumps(event).encode() + b'\n')
+            sent = len(job.events)
+            await writer.drain()
+            if job.state in FINISHED_STATES:
+                return
+            await updated.wait()
+
+    async def send_head(self, writer, status, content_type, length=None):
+        reasons = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found',
+                   405: 'Method Not Allowed', 409: 'Conflict'}
+        head = [f"HTTP/1.1 {status} {reasons[status]}", f"Content-Type: {content_type}", "Connection: close"]
+        if length is not None:
+            head.append(f"Content-Length: {length}")
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+        await writer.drain()
+
+    async def respond(self, writer, status, payload):
+        data = json.dumps(payload).encode()
+        await self.send_head(writer, status, 'application/json', len(data))
+        writer.write(data)
+        await writer.drain()
+
+async def serve(root, host=SERVICE_HOST, port=SERVICE_PORT, unix_path=None, workers=None, max_running=MAX_RUNNING_JOBS):
+    service = SchedulingService(root, workers, max_running)
+    await service.start()
+    if unix_path:
+        server = await asyncio.start_unix_server(service.handle, unix_path)
+    else:
+        server = await asyncio.start_server(service.handle, host, port)
+    print(f"Serving faculties from {service.root} on {unix_path or f'{host}:{port}'}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local scheduling service: queue jobs per faculty and stream their progress")
+    parser.add_argument('--root', default='.', help="Directory holding one sub-directory of CSV files per faculty")
+    parser.add_argument('--host', default=SERVICE_HOST)
+    parser.add_argument('--port', type=int, default=SERVICE_PORT)
+    parser.add_argument('--unix', help="Listen on this Unix socket path instead of TCP")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--max-jobs', type=int, default=MAX_RUNNING_JOBS, help="Jobs running at once")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.root, args.host, args.port, args.unix, args.workers, args.max_jobs))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,33 @@
+import pytest
+
+import benchmark
+import main
+
+def class_keys(scheduler):
+    return sorted((record.slot, record.subject_id, record.type_id, record.lecturer_id, record.room_id,
+                   tuple(sorted(record.group_ids)), record.main_group_id) for record in scheduler.schedule)
+
+@pytest.fixture(scope='module')
+def rows():
+    return benchmark.build_instance(0, 30, 30, 30, 30)
+
+@pytest.mark.parametrize('seed', range(3))
+def test_improve_schedule_never_raises_penalty(rows, seed):
+    scheduler = main.Scheduler(seed)
+    scheduler.load_rows(*rows)
+    scheduler.create_schedule()
+    before = scheduler.total_penalty()
+    history = scheduler.improve_schedule(0.5)
+    assert scheduler.total_penalty() <= before
+    assert history[-1][1] <= min(penalty for _, penalty in history)
+
+def test_improve_schedule_keeps_start_without_strict_gain():
+    # Zero-cost moves (splits, room and lecturer swaps) must not leave a reshuffled schedule behind
+    scheduler = main.Scheduler(0)
+    scheduler.load_rows(*benchmark.build_instance(0, main.NUM_GROUPS, main.NUM_SUBJECTS, main.NUM_LECTURERS, main.NUM_ROOMS))
+    scheduler.create_schedule()
+    before = scheduler.total_penalty()
+    classes = class_keys(scheduler)
+    scheduler.improve_schedule(0.5)
+    if scheduler.total_penalty() == before:
+        assert class_keys(scheduler) == classes